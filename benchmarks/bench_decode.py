@@ -0,0 +1,102 @@
+"""
+Benchmark of the response decode: full-width DataFrame + column selection (the old
+convert_to_dataframe) against the column-pruned one, with json (the default, API_JSON_DECODER=pruned)
+and with orjson (API_JSON_DECODER=orjson).
+
+Builds a large GetResultadosEncuentros response (synthetic enfrentamientos padded with the extra
+fields the real API returns and the ETL does not use), decodes it as get_enfrentamientos does,
+checks that every variant gives the same frame and prints time and peak allocations (tracemalloc):
+
+    python benchmarks/bench_decode.py --rows 200000 --extra-fields 20
+    python benchmarks/bench_decode.py --rows 33 --repeat 5000   # one real category, per-call cost
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import etl.utils
+from etl.utils import convert_to_dataframe
+from synthetic import category_ids, competition_ids, enfrentamientos
+
+COLUMNS = {'Fecha': 'fecha_partido', 'resul': 'resultado', 'eq1': 'club_local_id',
+           'eq2': 'club_visitante_id', 'num_jornada': 'jornada', 'verpartidos': 'verpartidos'}
+
+
+def build_response(rows, extra_fields):
+    records = []
+    for competition_id in competition_ids(rows // 297 + 1):
+        for categoria_id in category_ids(competition_id):
+            records.extend(enfrentamientos(categoria_id))
+    records = records[:rows]
+    for i, record in enumerate(records):
+        for field in range(extra_fields):
+            record[f"campo{field}"] = f"<span class='c{field}'>{i * 31 + field}</span>"
+    return json.dumps({"d": json.dumps(records)}).encode()
+
+
+def full_width(content):
+    # Before: wide object frame of every field, then select + rename
+    records = json.loads(json.loads(content)['d'])
+    return pd.DataFrame(records)[list(COLUMNS)].rename(columns=COLUMNS)
+
+
+def pruned(content, backend, decoder):
+    etl.utils.orjson = backend
+    etl.utils.API_JSON_DECODER = decoder
+    return convert_to_dataframe(etl.utils.json_loads(content), COLUMNS)
+
+
+def measure(repeat, func, *args):
+    gc.collect()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(*args)
+    elapsed = (time.perf_counter() - start) / repeat
+    gc.collect()
+    tracemalloc.start()
+    result = func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--extra-fields", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=1, help="decodes per variant, for small responses")
+    args = parser.parse_args()
+
+    orjson = etl.utils.orjson
+    content = build_response(args.rows, args.extra_fields)
+    decoder = etl.utils.API_JSON_DECODER
+    variants = [("json + frame completo", full_width, ()), ("json + columnas", pruned, (None, "pruned"))]
+    if orjson is not None:
+        variants.append(("orjson + columnas", pruned, (orjson, "orjson")))
+    else:
+        print("orjson no está instalado: solo se compara json")
+
+    print(f"Respuesta: {args.rows:,} filas, {len(COLUMNS) + args.extra_fields} campos, {len(content) / 2 ** 20:.1f} MiB")
+    baseline = None
+    for name, func, extra in variants:
+        elapsed, peak, frame = measure(args.repeat, func, content, *extra)
+        if baseline is None:
+            baseline = (elapsed, peak, frame)
+        else:
+            assert_frame_equal(baseline[2], frame)
+        print(f"   {name:22s} {1000 * elapsed:9.2f} ms  pico {peak / 2 ** 20:8.2f} MiB  "
+              f"({baseline[0] / elapsed:4.1f}x tiempo, {baseline[1] / peak:4.1f}x memoria)")
+    etl.utils.orjson = orjson
+    etl.utils.API_JSON_DECODER = decoder
+
+
+if __name__ == "__main__":
+    main()
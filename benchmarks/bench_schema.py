@@ -0,0 +1,133 @@
+"""
+Memory report of the extracted frames with and without the declared dtypes of etl/schema.py.
+
+Runs the real getters (etl/api_client.py) in-process on the synthetic dataset at the given scale,
+with the responses served straight from benchmarks/synthetic.py (no HTTP) and resultados fetched
+one response per category to keep the run short. Each table is reported as the loader receives it:
+the fetched frames concatenated, untyped (as before) and typed. Also times the row conversion of
+the values backend, whole-frame astype(object) (as before) against column by column, and checks that
+row_hash does not depend on the dtype of a score column (int64, float64 with a missing sibling, Int8)
+and that values too wide for a declared dtype are never wrapped around:
+
+    python benchmarks/bench_schema.py --scale 100
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import etl.api_client as api_client
+from etl.loaders import column_values
+from etl.schema import SCHEMAS, apply_schema, concat_frames
+from etl.validation import validate
+from fake_api import build_response
+from synthetic import competition_ids, enfrentamiento_ids
+from etl.utils import compute_row_hash, convert_to_base64
+
+
+def extract(scale):
+    # Untyped frames per table, as the getters returned them before etl.schema
+    def get_data(endpoint, payload):
+        if endpoint == "GetPartidosEnfrentamientos":  # here 'ide' is a category: all its partidos at once
+            records = [row for id in enfrentamiento_ids(payload['ide']) for row in build_response(endpoint, {'ide': id}, scale)]
+        else:
+            records = build_response(endpoint, payload, scale)
+        return {'d': json.dumps(records)}
+
+    api_client.get_data = get_data
+    api_client.apply_schema = lambda table, frame: frame
+    frames = {table: [] for table in SCHEMAS}
+    for competition_id in competition_ids(scale):
+        categorias = api_client.get_categorias(convert_to_base64(competition_id))
+        frames["categorias"].append(categorias)
+        for categoria_api_id in categorias['categoria_api_id'].tolist():
+            frames["clubs"].append(api_client.get_clubs(competition_id, categoria_api_id))
+            frames["enfrentamientos"].append(api_client.get_enfrentamientos(convert_to_base64(competition_id), categoria_api_id))
+            frames["resultados"].append(api_client.get_resultados(int(categoria_api_id)))
+    return frames
+
+
+def values_rows_before(frame):
+    frame = frame.astype(object)
+    return [tuple(row) for row in frame.where(frame.notna(), None).values]
+
+
+def values_rows_after(frame):
+    return list(zip(*(column_values(frame[col]) for col in frame.columns)))
+
+
+def check_row_hash():
+    # The same scores typed as to_int and apply_schema can leave them: the hash of a row must not change
+    # because a sibling row in the frame is missing a value (int64 -> float64)
+    scores = [6, 3, 0]
+    variants = {
+        "int64": pd.Series(scores, dtype="int64"),
+        "float64": pd.Series(scores + [np.nan], dtype="float64")[:3],
+        "Int8": pd.Series(scores, dtype="Int8"),
+        "str": pd.Series([str(score) for score in scores], dtype=object),
+    }
+    hashes = {name: compute_row_hash(pd.DataFrame({"partido_api_id": [1, 2, 3], "set1_local": values}),
+                                     ["partido_api_id", "set1_local"]).tolist()
+              for name, values in variants.items()}
+    assert all(values == hashes["int64"] for values in hashes.values()), hashes
+    missing = [pd.Series([np.nan], dtype="float64"), pd.Series([None], dtype=object), pd.Series([pd.NA], dtype="Int8")]
+    assert len({compute_row_hash(pd.DataFrame({"set1_local": values}), ["set1_local"])[0] for values in missing}) == 1
+    print(f"row_hash: mismo hash con {', '.join(variants)} (y con NaN/None/NA)")
+
+
+def check_out_of_range():
+    # Values that do not fit Int8/Int16/Int32 keep their value (Int64) and are rejected by validate
+    frame = pd.DataFrame({"partido_api_id": [1, 3_000_000_000], "enfrentamiento_api_id": [5, 5],
+                          "set1_local": [6, 200], "pista": ["1", "40000"], "row_hash": [1, 2]})
+    typed = apply_schema("resultados", frame)
+    assert typed[["partido_api_id", "set1_local", "pista"]].iloc[1].tolist() == [3_000_000_000, 200, 40000], typed
+    valid, rejected = validate("resultados", typed)
+    assert valid["partido_api_id"].tolist() == [1], valid
+    assert rejected["motivo"].tolist() == ["partido_api_id fuera de rango; set1_local fuera de rango; "
+                                           "pista fuera de rango"], rejected["motivo"].tolist()
+    print("apply_schema: valores fuera de rango conservados y rechazados por la validación")
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=100)
+    args = parser.parse_args()
+
+    check_row_hash()
+    check_out_of_range()
+    start = time.perf_counter()
+    frames = extract(args.scale)
+    print(f"Escala {args.scale}x: extraído en {time.perf_counter() - start:.1f}s")
+    print(f"{'tabla':>16} {'filas':>9} {'antes':>10} {'después':>10} {'reducción':>10} "
+          f"{'tuplas antes':>13} {'después':>8}")
+    total_before = total_after = 0
+    for table, parts in frames.items():
+        before = pd.concat(parts, ignore_index=True)
+        after = concat_frames(table, [apply_schema(table, part) for part in parts])
+        size_before = before.memory_usage(deep=True).sum()
+        size_after = after.memory_usage(deep=True).sum()
+        total_before += size_before
+        total_after += size_after
+        print(f"{table:>16} {len(after):>9,} {size_before / 2 ** 20:>6.1f} MiB {size_after / 2 ** 20:>6.1f} MiB "
+              f"{size_before / size_after:>9.1f}x {timed(values_rows_before, before):>12.2f}s "
+              f"{timed(values_rows_after, after):>7.2f}s")
+    print(f"{'total':>16} {'':>9} {total_before / 2 ** 20:>6.1f} MiB {total_after / 2 ** 20:>6.1f} MiB "
+          f"{total_before / total_after:>9.1f}x")
+    for table, parts in frames.items():
+        typed = apply_schema(table, parts[0])
+        print(f"   {table}: " + ", ".join(f"{col} {dtype}" for col, dtype in typed.dtypes.astype(str).items()))
+
+
+if __name__ == "__main__":
+    main()
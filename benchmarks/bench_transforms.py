@@ -0,0 +1,142 @@
+"""
+Micro-benchmark of the per-cell transforms (the helpers below + .apply, as the getters used to run them)
+against the vectorized ones (etl.transforms).
+
+Builds synthetic raw API frames shaped like GetPartidosEnfrentamientos (resultados) and
+GetResultadosEncuentros (enfrentamientos), runs both versions, checks that the outputs are
+identical (convert_to_int's as the nullable Int64 column to_int returns, also over a list of edge
+inputs) and prints the timings:
+
+    python benchmarks/bench_transforms.py --rows 1000000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_series_equal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from etl.transforms import clean_strings, extract_ids_partido, to_int, to_datetime, to_flag
+
+
+# Per-cell helpers the getters applied before etl.transforms, the reference for its outputs
+def clean_string(string):
+    match = re.search(r'>\s*([^<]+)\s*<', string)
+    if match:
+        return match.group(1).strip()
+    return string
+
+
+def extract_id_partido(verpartidos):
+    match = re.search(r"this,'(\d+)'", verpartidos)
+    return match.group(1) if match else None
+
+
+def convert_to_datetime(date_string, format='%d/%m/%Y %H:%M'):
+    try:
+        return pd.to_datetime(date_string, format=format)
+    except ValueError:
+        return pd.NaT
+
+
+def convert_to_int(value):
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return None
+
+
+INT_COLUMNS = ["idpartido", "s11", "s12", "s21", "s22", "s31", "s32", "puntos", "orden"]
+
+# Values int() takes or rejects in ways a numeric parse would not: literals only, truncated floats...
+INT_EDGE_CASES = ["4.0", "3.5", " 6 ", "", None, "+3", "-0", "1_000", "1__0", "٣", "abc", "0x10", "12 3", "\t8\n",
+                  7, 7.9, -2.5, float("nan"), True, np.int64(5)]
+
+
+def synthetic_resultados(n, rng):
+    scores = rng.integers(0, 8, (n, 6)).astype(str).astype(object)
+    scores[rng.random(n) < 0.4, 4:] = ""  # partidos decided in two sets
+    df = pd.DataFrame(scores, columns=["s11", "s12", "s21", "s22", "s31", "s32"])
+    df["idpartido"] = np.arange(n).astype(str).astype(object)
+    df["puntos"] = rng.integers(0, 3, n).astype(str).astype(object)
+    df["orden"] = rng.integers(1, 4, n).astype(str).astype(object)
+    df["win"] = rng.integers(0, 2, n).astype(str).astype(object)
+    return df
+
+
+def synthetic_enfrentamientos(n, rng):
+    clubs = np.array([f"<span class='eq'> Club {i} </span>" for i in range(80)], dtype=object)
+    results = np.array(["<b>2 - 1</b>", "<b>3 - 0</b>", "Sin resultado"], dtype=object)
+    days = rng.integers(1, 29, n)
+    return pd.DataFrame({
+        "eq1": clubs[rng.integers(0, len(clubs), n)],
+        "resul": results[rng.integers(0, len(results), n)],
+        "verpartidos": pd.Series(np.arange(n)).map(lambda i: f"verpartidos(this,'{i}')").astype(object),
+        "Fecha": pd.Series(days).map(lambda d: f"{d:02d}/10/2025 19:30").astype(object),
+    })
+
+
+def check_int_edge_cases():
+    expected = pd.Series([convert_to_int(value) for value in INT_EDGE_CASES], dtype="Int64")
+    assert_series_equal(to_int(pd.Series(INT_EDGE_CASES, dtype=object)), expected)
+    numbers = [3.0, float("nan"), 2.7, -2.7]
+    assert_series_equal(to_int(pd.Series(numbers)), pd.Series([convert_to_int(value) for value in numbers], dtype="Int64"))
+    assert_series_equal(to_int(pd.Series([1, None], dtype="Int8")), pd.Series([1, None], dtype="Int64"))
+
+
+def per_cell(res, enf):
+    out = {f"int:{col}": res[col].apply(convert_to_int).astype("Int64") for col in INT_COLUMNS}
+    out["flag:win"] = res["win"].apply(lambda x: True if int(x) == 1 else False)
+    out["clean:eq1"] = enf["eq1"].apply(clean_string)
+    out["clean:resul"] = enf["resul"].apply(clean_string)
+    out["id:verpartidos"] = enf["verpartidos"].apply(extract_id_partido)
+    out["date:Fecha"] = enf["Fecha"].apply(lambda x: convert_to_datetime(x, format='%d/%m/%Y %H:%M'))
+    return out
+
+
+def vectorized(res, enf):
+    out = {f"int:{col}": to_int(res[col]) for col in INT_COLUMNS}
+    out["flag:win"] = to_flag(res["win"])
+    out["clean:eq1"] = clean_strings(enf["eq1"])
+    out["clean:resul"] = clean_strings(enf["resul"])
+    out["id:verpartidos"] = extract_ids_partido(enf["verpartidos"])
+    out["date:Fecha"] = to_datetime(enf["Fecha"], format='%d/%m/%Y %H:%M')
+    return out
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    check_int_edge_cases()
+    rng = np.random.default_rng(args.seed)
+    res = synthetic_resultados(args.rows, rng)
+    enf = synthetic_enfrentamientos(args.rows, rng)
+
+    t_cell, old = timed(per_cell, res, enf)
+    t_vec, new = timed(vectorized, res, enf)
+
+    for key in old:
+        assert_series_equal(old[key], new[key], check_names=False)
+
+    print(f"Filas: {args.rows:,} ({len(old)} columnas transformadas, salidas idénticas, "
+          f"{len(INT_EDGE_CASES)} casos límite de convert_to_int)")
+    print(f"   per-cell (.apply): {t_cell:8.2f}s")
+    print(f"   vectorizado:       {t_vec:8.2f}s")
+    print(f"   speedup:           {t_cell / t_vec:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
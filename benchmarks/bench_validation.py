@@ -0,0 +1,72 @@
+"""
+Cost of the pre-load validation (etl/validation.py) on a synthetic resultados batch.
+
+Builds --rows typed resultados (etl/schema.py dtypes) over --rows / 3 enfrentamientos, with a share
+of bad rows (orphan enfrentamiento, differing duplicate, sets against is_local_ganador, NULL key),
+and times validate() with the parent keys known in memory, as the BatchLoader calls it:
+
+    python benchmarks/bench_validation.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from etl.schema import apply_schema
+from etl.validation import validate
+
+
+def build(rows, bad_share, seed=0):
+    rng = np.random.default_rng(seed)
+    enfrentamientos = np.arange(1, rows // 3 + 2)
+    local = rng.integers(0, 7, size=(rows, 3))
+    visitante = np.where(local == 6, rng.integers(0, 5, size=(rows, 3)), 6)
+    ganador = (local > visitante).sum(axis=1) >= 2
+    frame = pd.DataFrame({
+        "partido_api_id": np.arange(rows) + 1,
+        "is_local_ganador": ganador,
+        "nombre1_local": rng.choice([f"Jugador {i}" for i in range(2000)], rows),
+        "set1_local": local[:, 0], "set1_visitante": visitante[:, 0],
+        "set2_local": local[:, 1], "set2_visitante": visitante[:, 1],
+        "set3_local": local[:, 2], "set3_visitante": visitante[:, 2],
+        "fecha": pd.Timestamp("2025-10-01"),
+        "enfrentamiento_api_id": np.repeat(enfrentamientos, 3)[:rows],
+        "row_hash": rng.integers(-2 ** 62, 2 ** 62, rows),
+    })
+    # Bad rows, a quarter of each kind
+    bad = rng.choice(rows, int(rows * bad_share), replace=False)
+    orphan, duplicate, mismatch, null_key = np.array_split(bad, 4)
+    frame.loc[orphan, "enfrentamiento_api_id"] = -1
+    frame.loc[duplicate, "partido_api_id"] = (duplicate + 1) % rows + 1  # the next row's id
+    frame.loc[mismatch, "is_local_ganador"] = ~frame.loc[mismatch, "is_local_ganador"]
+    frame = apply_schema("resultados", frame)
+    frame.loc[null_key, "partido_api_id"] = pd.NA
+    return frame, set(enfrentamientos.tolist())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--bad-share", type=float, default=0.01)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    frame, parents = build(args.rows, args.bad_share)
+    print(f"{len(frame):,} resultados ({frame.memory_usage(deep=True).sum() / 2 ** 20:.1f} MiB)")
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        valid, rejected = validate("resultados", frame, known_keys={"enfrentamientos": parents})
+        timings.append(time.perf_counter() - start)
+    print(f"validate: {min(timings):.3f}s (mejor de {args.repeat}), {len(frame) / min(timings):,.0f} filas/s")
+    print(f"{len(valid):,} válidas, {len(rejected):,} rechazadas")
+    for motivo, n in rejected['motivo'].value_counts().items():
+        print(f"   {n:>7,} {motivo}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Local stand-in for the padelandwin.cat ajax.aspx API, serving the synthetic dataset (benchmarks/synthetic.py).
+
+Implements the five endpoints used by the ETL with the same {'d': <json string>} envelope,
+plus configurable latency and error rate:
+
+    python benchmarks/fake_api.py --scale 10 --port 8766 --latency-ms 80 --jitter-ms 40 --error-rate 0.01
+    API_BASE_URL=http://127.0.0.1:8766/ajax/ajax.aspx/ python main.py --competitions '*'
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import synthetic
+
+
+def competitions_in_scale(scale):
+    return set(synthetic.competition_ids(scale))
+
+
+def build_response(endpoint, payload, scale):
+    """Payload of one endpoint, as the list the real API JSON-encodes into 'd'."""
+    if endpoint == "GetListEntranscursoCompeticiones":
+        return synthetic.competitions(scale)
+    if endpoint == "Get_Cats_Competi":
+        competition_id = synthetic.decode_base64(payload["v"])
+        return synthetic.categorias(competition_id) if competition_id in competitions_in_scale(scale) else []
+    if endpoint == "LoadParejasCompeticiones":
+        return synthetic.clubs(int(payload["cat"]))
+    if endpoint == "GetResultadosEncuentros":
+        return synthetic.enfrentamientos(int(payload["cat"]))
+    if endpoint == "GetPartidosEnfrentamientos":
+        return synthetic.partidos(int(payload["ide"]))
+    raise KeyError(endpoint)
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real server, so the ETL's pooled session is exercised
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes: without this, Nagle + delayed ACK add ~40 ms per response
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server.count_request()
+
+        delay = server.latency + random.uniform(0, server.jitter)
+        if delay:
+            time.sleep(delay)
+        if server.error_rate and random.random() < server.error_rate:
+            self._send(server.error_status, b'{"Message":"Synthetic error"}')
+            return
+
+        endpoint = self.path.rstrip("/").rsplit("/", 1)[-1]
+        try:
+            data = build_response(endpoint, json.loads(body or b"{}"), server.scale)
+        except KeyError:
+            self._send(404, b'{"Message":"Unknown web method"}')
+            return
+        except (ValueError, TypeError):
+            self._send(400, b'{"Message":"Invalid payload"}')
+            return
+        self._send(200, json.dumps({"d": json.dumps(data)}).encode())
+
+    def _send(self, status, content):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, scale=1, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503):
+        super().__init__(address, FakeAPIHandler)
+        self.scale = scale
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self._requests_lock = threading.Lock()
+
+    def count_request(self):
+        with self._requests_lock:
+            self.requests += 1
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/ajax/ajax.aspx/"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fake padelandwin.cat API for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--scale", type=int, default=1, help="Number of synthetic competitions (1-1000)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Fixed latency added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Extra random latency, uniform in [0, jitter]")
+    parser.add_argument("--error-rate", type=float, default=0, help="Fraction of requests answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=503)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    server = FakeAPIServer((args.host, args.port), scale=args.scale, latency=args.latency_ms / 1000,
+                           jitter=args.jitter_ms / 1000, error_rate=args.error_rate, error_status=args.error_status)
+    print(f"Fake API (scale {args.scale}) en {server.base_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"{server.requests} peticiones servidas", flush=True)
+
+
+if __name__ == "__main__":
+    main()
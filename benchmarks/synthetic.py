@@ -0,0 +1,125 @@
+"""
+Deterministic synthetic dataset shaped like the padelandwin.cat API responses.
+
+Scale 1 is roughly one real season of one league (9 categories, 9 clubs per category,
+~33 enfrentamientos per category, 3 partidos per enfrentamiento). Scale N has N competitions
+of that size. Everything is derived from the IDs, so any response can be generated on demand
+without holding the whole dataset in memory.
+"""
+import base64
+import random
+from datetime import datetime, timedelta
+
+CATEGORIES_PER_COMPETITION = 9
+CLUBS_PER_CATEGORY = 9
+ENFRENTAMIENTOS_PER_CATEGORY = 33
+PARTIDOS_PER_ENFRENTAMIENTO = 3
+FIRST_COMPETITION_ID = 300
+SEASON_START = datetime(2025, 9, 20, 10, 0)
+GENEROS = ["Masculino", "Femenino", "Mixto"]
+PLAYED_FRACTION = 0.7  # enfrentamientos per category that already have a resultado
+
+
+def decode_base64(value):
+    return int(base64.b64decode(str(value)).decode())
+
+
+def competition_ids(scale):
+    return [FIRST_COMPETITION_ID + i for i in range(scale)]
+
+
+def category_ids(competition_id):
+    return [competition_id * 100 + i for i in range(CATEGORIES_PER_COMPETITION)]
+
+
+def club_name(categoria_id, club):
+    return f"Club Pàdel {categoria_id % 1000}-{club}"
+
+
+def competitions(scale):
+    return [{"idcompeticion": str(competition_id), "name": f"Lliga {14 + i} Vallès Sintètica"}
+            for i, competition_id in enumerate(competition_ids(scale))]
+
+
+def categorias(competition_id):
+    return [{"idcategoria": str(categoria_id), "name": f"Categoria {i + 1}", "genero": GENEROS[i % len(GENEROS)]}
+            for i, categoria_id in enumerate(category_ids(competition_id))]
+
+
+def clubs(categoria_id):
+    return [{"nom": f"<span class='nom'> {club_name(categoria_id, club)} </span>"}
+            for club in range(CLUBS_PER_CATEGORY)]
+
+
+def enfrentamiento_ids(categoria_id):
+    return [categoria_id * 1000 + j for j in range(ENFRENTAMIENTOS_PER_CATEGORY)]
+
+
+def partidos_ganados(enfrentamiento_id):
+    # Partidos won by the local pair, in order: shared by enfrentamientos() and partidos()
+    rng = random.Random(enfrentamiento_id)
+    return [rng.random() < 0.5 for _ in range(PARTIDOS_PER_ENFRENTAMIENTO)]
+
+
+def enfrentamientos(categoria_id):
+    rows = []
+    for j, enfrentamiento_id in enumerate(enfrentamiento_ids(categoria_id)):
+        rng = random.Random(enfrentamiento_id)
+        local, visitante = rng.sample(range(CLUBS_PER_CATEGORY), 2)
+        jornada = j // (CLUBS_PER_CATEGORY // 2) + 1
+        fecha = SEASON_START + timedelta(days=7 * (jornada - 1), hours=rng.randint(0, 10))
+        played = j < ENFRENTAMIENTOS_PER_CATEGORY * PLAYED_FRACTION
+        if played:
+            won = sum(partidos_ganados(enfrentamiento_id))
+            resultado = f"<b>{won} - {PARTIDOS_PER_ENFRENTAMIENTO - won}</b>"
+        else:
+            resultado = "Sin resultado"
+        rows.append({
+            "Fecha": fecha.strftime("%d/%m/%Y %H:%M"),
+            "resul": resultado,
+            "eq1": f"<a href='#'>{club_name(categoria_id, local)}</a>",
+            "eq2": f"<a href='#'>{club_name(categoria_id, visitante)}</a>",
+            "num_jornada": str(jornada),
+            "verpartidos": f"verpartidos(this,'{enfrentamiento_id}')",
+        })
+    return rows
+
+
+def partidos(enfrentamiento_id):
+    if enfrentamiento_id % 1000 >= ENFRENTAMIENTOS_PER_CATEGORY * PLAYED_FRACTION:
+        return []  # not played yet
+    rows = []
+    rng = random.Random(-enfrentamiento_id)
+    for k, local_gana in enumerate(partidos_ganados(enfrentamiento_id)):
+        # Sets won by the partido winner: 2-0, or 2-1 three times in ten
+        pattern = [True, True] if rng.random() < 0.7 else rng.sample([True, False], 2) + [True]
+        sets = []
+        for winner_takes_set in pattern:
+            local_set = winner_takes_set == local_gana
+            loser_games = rng.randint(0, 4)
+            sets.append((6, loser_games) if local_set else (loser_games, 6))
+        if len(sets) == 2:
+            sets.append(("", ""))
+        (s11, s12), (s21, s22), (s31, s32) = sets
+        rows.append({
+            "idpartido": enfrentamiento_id * 10 + k,
+            "win": "1" if local_gana else "2",
+            "nom11": f"Jugador {rng.randint(1, 4000)}", "nom12": f"Jugador {rng.randint(1, 4000)}",
+            "nom21": f"Jugador {rng.randint(1, 4000)}", "nom22": f"Jugador {rng.randint(1, 4000)}",
+            "s11": str(s11), "s12": str(s12), "s21": str(s21), "s22": str(s22), "s31": str(s31), "s32": str(s32),
+            "orden": str(k + 1),
+            "puntos": "1",
+        })
+    return rows
+
+
+def expected_counts(scale):
+    # Rows the ETL should extract for a given scale
+    played = sum(1 for j in range(ENFRENTAMIENTOS_PER_CATEGORY) if j < ENFRENTAMIENTOS_PER_CATEGORY * PLAYED_FRACTION)
+    categories = scale * CATEGORIES_PER_COMPETITION
+    return {
+        "categorias": categories,
+        "clubs": categories * CLUBS_PER_CATEGORY,
+        "enfrentamientos": categories * ENFRENTAMIENTOS_PER_CATEGORY,
+        "resultados": categories * played * PARTIDOS_PER_ENFRENTAMIENTO,
+    }
@@ -1,9 +1,10 @@
 import os
+from datetime import timedelta
 
 # ------------------------
 # API Configuration - Padel Web
 # ------------------------
-API_BASE_URL = "https://padelandwin.cat/ajax/ajax.aspx/"
+API_BASE_URL = os.getenv("API_BASE_URL", "https://padelandwin.cat/ajax/ajax.aspx/")
 API_HEADERS = {
     "Content-Type": "application/json; charset=UTF-8",
     "X-Requested-With": "XMLHttpRequest",
@@ -15,6 +16,164 @@ API_COOKIES = {
     "PadelWinCookie": "user=d/XvBfH7jw0lIYJOpAWmiw==&cookies=MA==&date=MTUvMDkvMjAyNSAxNzo0MDo1NQ=="
 }
 
+# Concurrent extraction: max requests in flight and minimum delay (seconds)
+# between two requests to the same host
+API_MAX_WORKERS = int(os.getenv("API_MAX_WORKERS", "8"))
+API_REQUEST_DELAY = float(os.getenv("API_REQUEST_DELAY", "0.05"))
+
+# HTTP session: timeouts (seconds) and retries with exponential backoff + jitter
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "5"))
+API_READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT", "30"))
+API_MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "4"))
+API_BACKOFF_BASE = float(os.getenv("API_BACKOFF_BASE", "0.5"))
+API_BACKOFF_MAX = float(os.getenv("API_BACKOFF_MAX", "20"))
+API_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Decoding of the records into the columns a table needs: "pruned" (json, each record reduced to those fields
+# while it is decoded: the lowest peak memory) or "orjson" (up to ~1.8x faster, but every full record is held
+# while decoding: ~1.7x the peak on wide responses, see benchmarks/bench_decode.py)
+API_JSON_DECODER = os.getenv("API_JSON_DECODER", "pruned")
+
+# ------------------------
+# HTTP response cache
+# ------------------------
+# Every response is stored on disk (needed by --replay). It is only served to a live run while it is
+# younger than the endpoint's TTL in seconds; 0 means always fetch live.
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") == "1"
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache"))
+CACHE_MAX_BYTES = int(float(os.getenv("CACHE_MAX_MB", "200")) * 1024 * 1024)
+CACHE_TTLS = {
+    "GetListEntranscursoCompeticiones": 24 * 3600,
+    "Get_Cats_Competi": 24 * 3600,
+    "LoadParejasCompeticiones": 6 * 3600,
+    "GetResultadosEncuentros": 0,
+    "GetPartidosEnfrentamientos": 0,
+}
+CACHE_DEFAULT_TTL = 0
+
+# ------------------------
+# Incremental extraction
+# ------------------------
+# Only fetch resultados of enfrentamientos that are new or changed since the last load.
+# The loaded state is read from the DB; the state file is the fallback when the DB is not reachable.
+DELTA_ENABLED = os.getenv("DELTA_ENABLED", "1") == "1"
+DELTA_STATE_FILE = os.getenv("DELTA_STATE_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "state", "delta_state.json"))
+
+# ------------------------
+# Change probe (main.py --probe)
+# ------------------------
+# A stdlib-only probe hashes the competition list and the enfrentamientos of every category. When the fingerprint
+# equals the one saved by the last successful run, main.py exits with PROBE_UNCHANGED_EXIT_CODE before importing
+# pandas/psycopg2.
+PROBE_STATE_FILE = os.getenv("PROBE_STATE_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "state", "probe_fingerprint.json"))
+PROBE_UNCHANGED_EXIT_CODE = int(os.getenv("PROBE_UNCHANGED_EXIT_CODE", "3"))
+
+# ------------------------
+# Load backends
+# ------------------------
+# 'values': execute_values upsert in pages of LOAD_PAGE_SIZE rows
+# 'copy': COPY FROM STDIN into a temp staging table, then one INSERT ... SELECT ... ON CONFLICT merge
+# LOAD_BACKENDS overrides the default per table, e.g. "resultados=copy,enfrentamientos=copy"
+LOAD_BACKEND = os.getenv("LOAD_BACKEND", "values")
+LOAD_BACKENDS = dict(item.split("=", 1) for item in os.getenv("LOAD_BACKENDS", "").split(",") if item)
+LOAD_PAGE_SIZE = int(os.getenv("LOAD_PAGE_SIZE", "1000"))
+
+# ------------------------
+# Validation
+# ------------------------
+# Every batch is checked before load (keys, foreign keys, sets vs winner); offending rows go to the cuarentena
+# table with their reasons and the rest is loaded. With 0, only duplicated keys are dropped (last version wins).
+VALIDATION_ENABLED = os.getenv("VALIDATION_ENABLED", "1") == "1"
+
+# ------------------------
+# Aggregates
+# ------------------------
+# The clasificacion and estadisticas_jugadores tables are updated with every resultados batch, from the changed rows
+# only. After running with 0, rebuild them with `main.py --rebuild-aggregates`.
+AGGREGATES_ENABLED = os.getenv("AGGREGATES_ENABLED", "1") == "1"
+
+# ------------------------
+# Change feed
+# ------------------------
+# Every row the loaders insert or update is also recorded in the cambios outbox table (its key, plus the old and new
+# values of the changed columns for updates), in the same statement as the upsert. With CHANGES_DIR set, each run also writes its events
+# to CHANGES_DIR/cambios_<run>.jsonl (every sweep or poll cycle of the daemon is a run). Events older than CHANGES_RETENTION_DAYS are deleted.
+CHANGES_ENABLED = os.getenv("CHANGES_ENABLED", "1") == "1"
+CHANGES_DIR = os.getenv("CHANGES_DIR", "")
+CHANGES_RETENTION_DAYS = float(os.getenv("CHANGES_RETENTION_DAYS", "30"))
+# Not part of the events: the load date and the content hash change with every update
+CHANGES_IGNORED_COLUMNS = ["fecha", "row_hash"]
+
+# ------------------------
+# Streaming pipeline
+# ------------------------
+# Extracted frames go through a bounded queue to the loader, which writes each table every PIPELINE_BATCH_SIZE rows.
+# Resultados are fetched and handed over every RESULTADOS_CHUNK_SIZE enfrentamientos.
+PIPELINE_BATCH_SIZE = int(os.getenv("PIPELINE_BATCH_SIZE", "5000"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))
+RESULTADOS_CHUNK_SIZE = int(os.getenv("RESULTADOS_CHUNK_SIZE", "50"))
+
+# ------------------------
+# Competitions
+# ------------------------
+# Name patterns of the competitions to refresh (see get_competitions); with several competitions,
+# each one is extracted in its own process and API_MAX_WORKERS is shared between them
+COMPETITIONS = [c for c in os.getenv("COMPETITIONS", "lliga14").split(",") if c]
+PROCESS_WORKERS = int(os.getenv("PROCESS_WORKERS", "4"))
+
+# ------------------------
+# Scheduler (main.py --daemon)
+# ------------------------
+# Instead of full runs at fixed times, the daemon polls the categories with matches waiting for a resultado:
+# first SCHEDULER_FIRST_POLL_MINUTES after fecha_partido, then with a backoff between the MIN and MAX minutes,
+# for at most SCHEDULER_MAX_AGE_DAYS. A full sweep of all the competitions runs every SCHEDULER_SWEEP_HOURS.
+SCHEDULER_TIMEZONE = os.getenv("SCHEDULER_TIMEZONE", "Europe/Madrid")
+SCHEDULER_FIRST_POLL = timedelta(minutes=float(os.getenv("SCHEDULER_FIRST_POLL_MINUTES", "120")))
+SCHEDULER_BACKOFF_MIN = timedelta(minutes=float(os.getenv("SCHEDULER_BACKOFF_MIN_MINUTES", "30")))
+SCHEDULER_BACKOFF_MAX = timedelta(minutes=float(os.getenv("SCHEDULER_BACKOFF_MAX_MINUTES", "720")))
+SCHEDULER_MAX_AGE = timedelta(days=float(os.getenv("SCHEDULER_MAX_AGE_DAYS", "7")))
+SCHEDULER_SWEEP_INTERVAL = timedelta(hours=float(os.getenv("SCHEDULER_SWEEP_HOURS", "24")))
+SCHEDULER_ERROR_RETRY = timedelta(minutes=float(os.getenv("SCHEDULER_ERROR_RETRY_MINUTES", "10")))
+
+# ------------------------
+# Historical backfill (main.py --backfill)
+# ------------------------
+# Past seasons are loaded one shard (competition, category) at a time, BACKFILL_WORKERS shards fetched at once.
+# Shards are marked done every BACKFILL_COMMIT_SHARDS, in the same transaction as their rows (see etl/backfill.py).
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", "4"))
+BACKFILL_COMMIT_SHARDS = int(os.getenv("BACKFILL_COMMIT_SHARDS", "20"))
+
+# ------------------------
+# Checkpoints
+# ------------------------
+# Extracted frames are written to CHECKPOINT_DIR (Parquet, needs pyarrow) while the run goes on, and removed
+# once everything is loaded. After a failed load, `main.py --resume` loads them again without calling the API.
+CHECKPOINT_ENABLED = os.getenv("CHECKPOINT_ENABLED", "1") == "1"
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "checkpoints"))
+
+# ------------------------
+# Run metrics
+# ------------------------
+# Every run writes logs/padel_etl_<timestamp>.metrics.json next to its log (stage timings, HTTP latency
+# histogram, rows/s, peak RSS). METRICS_TRACE_MEMORY adds the tracemalloc peak of Python allocations,
+# at the cost of a run ~3x slower (every pandas allocation is traced).
+METRICS_TRACE_MEMORY = os.getenv("METRICS_TRACE_MEMORY", "0") == "1"
+
+# ------------------------
+# Logging
+# ------------------------
+# Records are queued and written by a background thread. LOG_FORMAT=json writes the log file as JSON lines
+# (the console stays plain text). Each run's file is rotated and gzipped past LOG_MAX_MB (LOG_BACKUP_COUNT
+# backups); earlier runs' logs are gzipped, deleted after LOG_RETENTION_DAYS and capped at LOG_MAX_TOTAL_MB.
+# Files of runs still alive (logs/padel_etl_<timestamp>.pid) and files tracked by git are left alone.
+# Per-item progress is aggregated into one line every LOG_PROGRESS_SECONDS.
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_MAX_BYTES = int(float(os.getenv("LOG_MAX_MB", "20")) * 1024 * 1024)
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_RETENTION_DAYS = float(os.getenv("LOG_RETENTION_DAYS", "30"))
+LOG_MAX_TOTAL_BYTES = int(float(os.getenv("LOG_MAX_TOTAL_MB", "200")) * 1024 * 1024)
+LOG_PROGRESS_INTERVAL = float(os.getenv("LOG_PROGRESS_SECONDS", "10"))
+
 # ------------------------
 # Configuración Supabase / PostgreSQL
 # ------------------------
@@ -0,0 +1,282 @@
+import io
+import logging
+
+import numpy as np
+import pandas as pd
+from psycopg2.extras import execute_values
+
+from .validation import SETS
+
+# Obtener el logger configurado
+logger = logging.getLogger('padel_etl')
+
+# Columns of resultados the aggregates are computed from
+RESULTADO_COLUMNS = ["partido_api_id", "enfrentamiento_api_id", "is_local_ganador", "jugador1_local_id",
+                     "jugador2_local_id", "jugador1_visitante_id", "jugador2_visitante_id", "set1_local",
+                     "set1_visitante", "set2_local", "set2_visitante", "set3_local", "set3_visitante", "puntos"]
+
+CLASIFICACION_KEYS = ["categoria_api_id", "club"]
+CLASIFICACION_COLUMNS = ["partidos_jugados", "partidos_ganados", "partidos_perdidos", "puntos", "sets_favor",
+                         "sets_contra", "juegos_favor", "juegos_contra"]
+JUGADOR_KEYS = ["jugador_id", "categoria_api_id"]
+JUGADOR_COLUMNS = ["partidos_jugados", "partidos_ganados", "sets_ganados", "sets_perdidos", "juegos_ganados",
+                   "juegos_perdidos"]
+TABLES = {
+    "clasificacion": (CLASIFICACION_KEYS, CLASIFICACION_COLUMNS),
+    "estadisticas_jugadores": (JUGADOR_KEYS, JUGADOR_COLUMNS),
+}
+
+# Stored version of the resultados of a batch, with the enfrentamiento that places them and
+# whether the batch brings the same row_hash (the upsert will leave those untouched). The aggregates always
+# follow the stored enfrentamiento: a change of its category or clubs is moved by move_enfrentamientos.
+STORED_SQL = f"""
+SELECT {', '.join(f'r.{col}' for col in RESULTADO_COLUMNS)}, r.row_hash,
+       e.categoria_api_id, e.club_local_id, e.club_visitante_id, r.row_hash = b.row_hash AS unchanged
+FROM unnest(%s::int[], %s::bigint[]) AS b(partido_api_id, row_hash)
+JOIN resultados r ON r.partido_api_id = b.partido_api_id
+JOIN enfrentamientos e ON e.enfrentamiento_api_id = r.enfrentamiento_api_id;
+"""
+
+ENFRENTAMIENTOS_SQL = """
+SELECT enfrentamiento_api_id, categoria_api_id, club_local_id, club_visitante_id
+FROM enfrentamientos WHERE enfrentamiento_api_id = ANY(%s);
+"""
+
+# Stored enfrentamientos of a batch whose category or clubs change, locked until the caller commits
+MOVED_SQL = """
+SELECT e.enfrentamiento_api_id, e.categoria_api_id, e.club_local_id, e.club_visitante_id,
+       b.categoria_api_id, b.club_local_id, b.club_visitante_id
+FROM unnest(%s::int[], %s::int[], %s::text[], %s::text[])
+     AS b(enfrentamiento_api_id, categoria_api_id, club_local_id, club_visitante_id)
+JOIN enfrentamientos e ON e.enfrentamiento_api_id = b.enfrentamiento_api_id
+WHERE (e.categoria_api_id, e.club_local_id, e.club_visitante_id)
+      IS DISTINCT FROM (b.categoria_api_id, b.club_local_id, b.club_visitante_id)
+ORDER BY e.enfrentamiento_api_id
+FOR UPDATE OF e;
+"""
+RESULTADOS_OF_SQL = f"""
+SELECT {', '.join(RESULTADO_COLUMNS)} FROM resultados WHERE enfrentamiento_api_id = ANY(%s);
+"""
+
+ALL_SQL = f"""
+SELECT {', '.join(f'r.{col}' for col in RESULTADO_COLUMNS)}, r.row_hash,
+       e.categoria_api_id, e.club_local_id, e.club_visitante_id
+FROM resultados r
+JOIN enfrentamientos e USING (enfrentamiento_api_id);
+"""
+CONTEXT_COLUMNS = RESULTADO_COLUMNS + ["row_hash", "categoria_api_id", "club_local_id", "club_visitante_id"]
+
+
+# Transaction-level advisory lock held by every writer of the aggregates: the deltas are computed from a
+# read of the stored rows, so two runs loading the same partidos at once would both add them
+LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext('padel_etl.agregados'));"
+
+
+def _add_sql(table, keys, columns):
+    # Deltas are added to the stored counters (the stored rows were read under LOCK_SQL)
+    return f"""
+    INSERT INTO {table} ({', '.join(keys + columns)}) VALUES %s
+    ON CONFLICT ({', '.join(keys)}) DO UPDATE
+    SET {', '.join(f'{col} = {table}.{col} + EXCLUDED.{col}' for col in columns)}, updated_at = now();
+    """
+
+ADD_SQL = {table: _add_sql(table, keys, columns) for table, (keys, columns) in TABLES.items()}
+
+REBUILT_SQL = """
+INSERT INTO agregados_estado (unica) VALUES (TRUE)
+ON CONFLICT (unica) DO UPDATE SET reconstruido_at = now();
+"""
+
+
+def lock_aggregates(cursor):
+    # Waits for concurrent writers until the caller's transaction ends (taking it again does not wait). Callers
+    # take it before any other write, so that waiting on it never holds a lock another writer needs
+    cursor.execute(LOCK_SQL)
+
+def _sides(rows, sign):
+    """
+    Counters of each side of the played partidos in `rows`, multiplied by `sign` (+1 for the version being
+    loaded, -1 for the stored one it replaces). Returns (clubs frame, players frame), one row per side.
+    """
+    sets = {side: np.zeros(len(rows), dtype=np.int64) for side in ("local", "visitante")}
+    juegos = {side: np.zeros(len(rows), dtype=np.int64) for side in ("local", "visitante")}
+    jugado = np.zeros(len(rows), dtype=bool)
+    for local_col, visitante_col in SETS:
+        home = pd.to_numeric(rows[local_col]).to_numpy(dtype='float64', na_value=np.nan)
+        away = pd.to_numeric(rows[visitante_col]).to_numpy(dtype='float64', na_value=np.nan)
+        played = ~np.isnan(home) & ~np.isnan(away)
+        jugado |= played
+        sets["local"] += home > away
+        sets["visitante"] += away > home
+        juegos["local"] += np.where(played, home, 0).astype(np.int64)
+        juegos["visitante"] += np.where(played, away, 0).astype(np.int64)
+    # Partidos without any set score are not played yet
+    rows = rows[jugado]
+    ganador = rows['is_local_ganador'].to_numpy(dtype=bool, na_value=False)
+    puntos = pd.to_numeric(rows['puntos']).fillna(0).to_numpy(dtype=np.int64)
+    sets = {side: values[jugado] for side, values in sets.items()}
+    juegos = {side: values[jugado] for side, values in juegos.items()}
+
+    clubs, jugadores = [], []
+    for side, other, ganado in (("local", "visitante", ganador), ("visitante", "local", ~ganador)):
+        counters = {
+            "ganados": ganado.astype(np.int64) * sign,
+            "sets_favor": sets[side] * sign,
+            "sets_contra": sets[other] * sign,
+            "juegos_favor": juegos[side] * sign,
+            "juegos_contra": juegos[other] * sign,
+        }
+        clubs.append(pd.DataFrame({
+            "categoria_api_id": rows['categoria_api_id'].to_numpy(),
+            "club": rows[f'club_{side}_id'].astype(object).to_numpy(),
+            "partidos_jugados": sign,
+            "partidos_ganados": counters["ganados"],
+            "partidos_perdidos": (1 - ganado.astype(np.int64)) * sign,
+            "puntos": np.where(ganado, puntos, 0) * sign,
+            "sets_favor": counters["sets_favor"],
+            "sets_contra": counters["sets_contra"],
+            "juegos_favor": counters["juegos_favor"],
+            "juegos_contra": counters["juegos_contra"],
+        }))
+        for number in (1, 2):
+            jugadores.append(pd.DataFrame({
+                "jugador_id": rows[f'jugador{number}_{side}_id'].to_numpy(dtype='float64', na_value=np.nan),
+                "categoria_api_id": rows['categoria_api_id'].to_numpy(),
+                "partidos_jugados": sign,
+                "partidos_ganados": counters["ganados"],
+                "sets_ganados": counters["sets_favor"],
+                "sets_perdidos": counters["sets_contra"],
+                "juegos_ganados": counters["juegos_favor"],
+                "juegos_perdidos": counters["juegos_contra"],
+            }))
+    return pd.concat(clubs, ignore_index=True), pd.concat(jugadores, ignore_index=True)
+
+def _deltas(sides):
+    """Counters of (clubs, players) frames summed per key of each aggregate table, without all-zero rows."""
+    frames = {
+        "clasificacion": pd.concat([clubs for clubs, _ in sides], ignore_index=True).dropna(subset=["club"]),
+        "estadisticas_jugadores": pd.concat([jugadores for _, jugadores in sides],
+                                            ignore_index=True).dropna(subset=["jugador_id"]),
+    }
+    deltas = {}
+    for table, frame in frames.items():
+        keys, columns = TABLES[table]
+        # Sorted keys: concurrent runs lock the rows in the same order
+        delta = frame.groupby(keys, sort=True)[columns].sum()
+        delta = delta[(delta.to_numpy() != 0).any(axis=1)].reset_index()
+        deltas[table] = delta.astype({key: np.int64 for key in keys if key != "club"})
+    return deltas
+
+def _add(cursor, deltas):
+    # Returns {table: aggregate rows written}
+    for table, delta in deltas.items():
+        if not delta.empty:
+            execute_values(cursor, ADD_SQL[table], list(zip(*(delta[col].tolist() for col in delta.columns))),
+                           page_size=1000)
+    return {table: len(delta) for table, delta in deltas.items()}
+
+def update_aggregates(cursor, resultados):
+    """
+    Move the standings and player stats by the resultados about to be upserted, in the caller's transaction.
+
+    Only the rows whose row_hash changed count: each adds its counters and the stored version it replaces
+    (read here, before the upsert, under lock_aggregates) subtracts its own. If the aggregates were never
+    rebuilt (first run after the migration, see ensure_aggregates), they are rebuilt first.
+
+    Returns:
+        {table: aggregate rows written}
+    """
+    lock_aggregates(cursor)
+    ensure_aggregates(cursor)
+
+    resultados = resultados[resultados['partido_api_id'].notna().to_numpy()]
+    cursor.execute(STORED_SQL, (resultados['partido_api_id'].tolist(), resultados['row_hash'].tolist()))
+    stored = pd.DataFrame(cursor.fetchall(), columns=CONTEXT_COLUMNS + ["unchanged"])
+    unchanged = stored['partido_api_id'][stored['unchanged'].astype(bool)]
+    changed = resultados[~resultados['partido_api_id'].isin(unchanged).to_numpy()]
+    if changed.empty:
+        return {"clasificacion": 0, "estadisticas_jugadores": 0}
+    replaced = stored[~stored['unchanged'].astype(bool)]
+
+    cursor.execute(ENFRENTAMIENTOS_SQL, (changed['enfrentamiento_api_id'].dropna().unique().tolist(),))
+    context = pd.DataFrame(cursor.fetchall(), columns=["enfrentamiento_api_id", "categoria_api_id", "club_local_id",
+                                                       "club_visitante_id"])
+    changed = changed[RESULTADO_COLUMNS].astype({"enfrentamiento_api_id": "Int64"}).merge(
+        context.astype({"enfrentamiento_api_id": "Int64"}), on="enfrentamiento_api_id")
+    return _add(cursor, _deltas([_sides(changed, 1), _sides(replaced, -1)]))
+
+def move_enfrentamientos(cursor, enfrentamientos):
+    """
+    Move the standings and player stats of the stored resultados of the enfrentamientos whose category or
+    clubs are about to change, in the caller's transaction and before the enfrentamientos upsert: their
+    counters are subtracted from the stored category and clubs and added to the batch's.
+
+    Returns:
+        {table: aggregate rows written}
+    """
+    lock_aggregates(cursor)
+    ensure_aggregates(cursor)
+    batch = enfrentamientos[enfrentamientos['enfrentamiento_api_id'].notna().to_numpy()]
+    context = [batch[col].astype(object).where(batch[col].notna(), None).tolist()
+               for col in ("categoria_api_id", "club_local_id", "club_visitante_id")]
+    context[0] = [None if id is None else int(id) for id in context[0]]
+    cursor.execute(MOVED_SQL, ([int(id) for id in batch['enfrentamiento_api_id']], *context))
+    columns = ["categoria_api_id", "club_local_id", "club_visitante_id"]
+    moved = pd.DataFrame(cursor.fetchall(), columns=["enfrentamiento_api_id", *columns,
+                                                     *(f"nuevo_{col}" for col in columns)])
+    if moved.empty:
+        return {"clasificacion": 0, "estadisticas_jugadores": 0}
+
+    cursor.execute(RESULTADOS_OF_SQL, (moved['enfrentamiento_api_id'].tolist(),))
+    resultados = pd.DataFrame(cursor.fetchall(), columns=RESULTADO_COLUMNS)
+    stored = resultados.merge(moved[["enfrentamiento_api_id", *columns]], on="enfrentamiento_api_id")
+    new = resultados.merge(moved[["enfrentamiento_api_id", *(f"nuevo_{col}" for col in columns)]].rename(
+        columns={f"nuevo_{col}": col for col in columns}), on="enfrentamiento_api_id")
+    return _add(cursor, _deltas([_sides(new, 1), _sides(stored, -1)]))
+
+def ensure_aggregates(cursor):
+    # Rebuild once, when no rebuild is recorded in agregados_estado; under lock_aggregates, concurrent runs
+    # wait for the first one's rebuild instead of repeating it
+    lock_aggregates(cursor)
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM agregados_estado);")
+    if not cursor.fetchone()[0]:
+        rebuild_aggregates(cursor)
+
+def rebuild_aggregates(cursor, chunk_size=50000):
+    """
+    Recompute the standings and player stats from every stored resultado, e.g. after a manual fix in the DB
+    or a run with AGGREGATES_ENABLED=0. Resultados are read through a server-side cursor chunk_size rows at
+    a time and summed in memory (one row per key), then each table is written with a single COPY.
+
+    Returns:
+        {table: rows}
+    """
+    logger.info("🧮 Reconstruyendo clasificación y estadísticas de jugadores...")
+    lock_aggregates(cursor)
+    totals = None
+    resultados = 0
+    with cursor.connection.cursor(name="agregados") as source:
+        source.itersize = chunk_size
+        source.execute(ALL_SQL)
+        while True:
+            rows = source.fetchmany(chunk_size)
+            if not rows:
+                break
+            deltas = _deltas([_sides(pd.DataFrame(rows, columns=CONTEXT_COLUMNS), 1)])
+            if totals is not None:
+                deltas = {table: pd.concat([totals[table], delta]).groupby(TABLES[table][0], sort=True).sum().reset_index()
+                          for table, delta in deltas.items()}
+            totals = deltas
+            resultados += len(rows)
+
+    cursor.execute("DELETE FROM clasificacion; DELETE FROM estadisticas_jugadores;")
+    for table, total in (totals or {}).items():
+        buffer = io.StringIO()
+        total.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {table} ({', '.join(total.columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    cursor.execute(REBUILT_SQL)
+    counts = {table: len(totals[table]) if totals else 0 for table in TABLES}
+    logger.info(f"✅ Agregados reconstruidos desde {resultados} resultados: {counts['clasificacion']} filas de "
+                f"clasificación, {counts['estadisticas_jugadores']} de jugadores")
+    return counts
@@ -1,112 +1,167 @@
-from .utils import convert_to_datetime, get_data, convert_to_dataframe, convert_to_base64,clean_string,extract_id_partido, convert_to_int
+from .utils import get_data, convert_to_dataframe, compute_row_hash
+from .transforms import clean_strings, extract_ids_partido, to_int, to_datetime, to_flag
+from .metrics import timed
+from .schema import apply_schema, concat_frames
+from .probe import select_competitions
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from datetime import date, timedelta
+import pandas as pd
+import sys
+import os
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import API_MAX_WORKERS
+
+# Snapshot date of the rows ('fecha'); the getters take another one for past seasons (etl.backfill)
 my_date = date.today()  #- timedelta(days=180)  # Fecha fija para los datos
 
-def get_competition_id(name):
+def get_competitions(patterns):
+    # Competitions "en transcurso" matching any name pattern (see etl.probe.select_competitions)
     competitions = convert_to_dataframe(get_data("GetListEntranscursoCompeticiones", {'v':'100'}))
-    idcompeticion = competitions[competitions['name'].str.replace(" ", "").str.lower().str.contains(name)]['idcompeticion'].iloc[0]
-    idcompeticion_base64 = convert_to_base64(idcompeticion)
-    return idcompeticion, idcompeticion_base64
-
-def get_categorias(id_base64):
-    result = get_data("Get_Cats_Competi", {'v':id_base64})
-    categories = convert_to_dataframe(result)[["idcategoria", "name", "genero"]].rename(columns={
-        "idcategoria": "categoria_api_id",
-        "name": "nombre",
-        "genero": "genero"  
-    })
-    categories['fecha'] = my_date
+    return select_competitions(zip(competitions['idcompeticion'].tolist(), competitions['name'].tolist()), patterns)
+
+def get_categorias(id_base64, fecha=None):
+    with timed("extract", "categorias"):
+        result = get_data("Get_Cats_Competi", {'v':id_base64})
+    with timed("transform", "categorias") as timer:
+        categories = convert_to_dataframe(result, {
+            "idcategoria": "categoria_api_id",
+            "name": "nombre",
+            "genero": "genero"
+        })
+        categories['fecha'] = my_date if fecha is None else fecha
+        categories['row_hash'] = compute_row_hash(categories, ["categoria_api_id", "nombre", "genero"])
+        categories = apply_schema("categorias", categories)
+        timer.rows = len(categories)
     return categories
     
 
-def get_clubs(id, categoria_api_id):
-    result = get_data("LoadParejasCompeticiones", {'v':id,'ace':'undefined','cat':categoria_api_id,'type':'1'})
-    clubs_df = convert_to_dataframe(result)[['nom']].rename(columns={'nom': 'nombre'})
-    clubs_df['nombre'] = clubs_df['nombre'].apply(clean_string)
-    clubs_df['categoria_api_id'] = categoria_api_id
-    clubs_df['fecha'] = my_date
+def get_clubs(id, categoria_api_id, fecha=None):
+    with timed("extract", "clubs", categoria_api_id):
+        result = get_data("LoadParejasCompeticiones", {'v':id,'ace':'undefined','cat':categoria_api_id,'type':'1'})
+    with timed("transform", "clubs", categoria_api_id) as timer:
+        clubs_df = convert_to_dataframe(result, {'nom': 'nombre'})
+        clubs_df['nombre'] = clean_strings(clubs_df['nombre'])
+        clubs_df['categoria_api_id'] = categoria_api_id
+        clubs_df['fecha'] = my_date if fecha is None else fecha
+        clubs_df['row_hash'] = compute_row_hash(clubs_df, ['nombre', 'categoria_api_id'])
+        clubs_df = apply_schema("clubs", clubs_df)
+        timer.rows = len(clubs_df)
     return clubs_df
 
-def get_enfrentamientos(id_base64, categoria_api_id):
+def get_enfrentamientos(id_base64, categoria_api_id, fecha=None):
     # Get matchups for a category
-    result = get_data("GetResultadosEncuentros", {'v':id_base64,'cat':categoria_api_id,'ty':'7','tab':'2','ace':'0','jornada':'0','lugar':'0'})
-    enfrentamientos_df = convert_to_dataframe(result)[["Fecha", "resul", "eq1", "eq2", "num_jornada", "verpartidos"]]
-    
-    # 1. First STEP: Extract and filter valid IDs
-    enfrentamientos_df['temp_id'] = enfrentamientos_df['verpartidos'].apply(extract_id_partido)
-    enfrentamientos_df = enfrentamientos_df[
-        (enfrentamientos_df['temp_id'].notnull()) &           # No NaN/None
-        (enfrentamientos_df['temp_id'] != '') &               # No string vacío
-        (enfrentamientos_df['temp_id'] != '0') &              # No '0' string
-        (enfrentamientos_df['temp_id'].astype(str) != 'nan')  # No 'nan' string
-    ]
-
-     # 2. Reneme columns
-    enfrentamientos_df = enfrentamientos_df.rename(columns={
-        'eq1': 'club_local_id', 
-        'eq2': 'club_visitante_id', 
-        'resul': 'resultado', 
-        'Fecha': 'fecha_partido', 
-        'num_jornada': 'jornada', 
-        'temp_id': 'enfrentamiento_api_id'
-    })
-
-    # 3. Add additional columns
-    enfrentamientos_df['fecha'] = my_date
-    enfrentamientos_df['categoria_api_id'] = categoria_api_id
-    
-    # 4. Apply corresponding data types
-    # Strings
-    for col in ["club_local_id", "club_visitante_id", "resultado"]:
-        enfrentamientos_df[col] = enfrentamientos_df[col].apply(clean_string)
-    # Integers
-    for col in ["jornada", "enfrentamiento_api_id"]:
-        enfrentamientos_df[col] = enfrentamientos_df[col].apply(convert_to_int)
-    # Datetime
-    enfrentamientos_df['fecha_partido'] = enfrentamientos_df['fecha_partido'].apply( 
-        lambda x: convert_to_datetime(x, format='%d/%m/%Y %H:%M')
-    )
-
-    # Delete 'verpartidos' column if still exists
-    if 'verpartidos' in enfrentamientos_df.columns:
-        enfrentamientos_df = enfrentamientos_df.drop('verpartidos', axis=1)
+    with timed("extract", "enfrentamientos", categoria_api_id):
+        result = get_data("GetResultadosEncuentros", {'v':id_base64,'cat':categoria_api_id,'ty':'7','tab':'2','ace':'0','jornada':'0','lugar':'0'})
+    with timed("transform", "enfrentamientos", categoria_api_id) as timer:
+        # 1. Only the needed columns, already renamed
+        enfrentamientos_df = convert_to_dataframe(result, {
+            'Fecha': 'fecha_partido',
+            'resul': 'resultado',
+            'eq1': 'club_local_id',
+            'eq2': 'club_visitante_id',
+            'num_jornada': 'jornada',
+            'verpartidos': 'verpartidos'
+        })
+
+        # 2. Extract and filter valid IDs
+        enfrentamientos_df['enfrentamiento_api_id'] = extract_ids_partido(enfrentamientos_df['verpartidos'])
+        enfrentamientos_df = enfrentamientos_df[
+            (enfrentamientos_df['enfrentamiento_api_id'].notnull()) &           # No NaN/None
+            (enfrentamientos_df['enfrentamiento_api_id'] != '') &               # No string vacío
+            (enfrentamientos_df['enfrentamiento_api_id'] != '0') &              # No '0' string
+            (enfrentamientos_df['enfrentamiento_api_id'].astype(str) != 'nan')  # No 'nan' string
+        ]
+
+        # 3. Add additional columns
+        enfrentamientos_df['fecha'] = my_date if fecha is None else fecha
+        enfrentamientos_df['categoria_api_id'] = categoria_api_id
     
+        # 4. Apply corresponding data types
+        # Strings
+        for col in ["club_local_id", "club_visitante_id", "resultado"]:
+            enfrentamientos_df[col] = clean_strings(enfrentamientos_df[col])
+        # Integers
+        for col in ["jornada", "enfrentamiento_api_id"]:
+            enfrentamientos_df[col] = to_int(enfrentamientos_df[col])
+        # Datetime
+        enfrentamientos_df['fecha_partido'] = to_datetime(enfrentamientos_df['fecha_partido'], format='%d/%m/%Y %H:%M')
+
+        # Delete 'verpartidos' column if still exists
+        if 'verpartidos' in enfrentamientos_df.columns:
+            enfrentamientos_df = enfrentamientos_df.drop('verpartidos', axis=1)
+
+        # 5. Content hash ('fecha' is the snapshot date, not content)
+        enfrentamientos_df['row_hash'] = compute_row_hash(enfrentamientos_df, [
+            "fecha_partido", "resultado", "club_local_id", "club_visitante_id", "jornada", "enfrentamiento_api_id", "categoria_api_id"])
+
+        # 6. Declared dtypes (etl.schema), after the hash so that stored hashes stay valid
+        enfrentamientos_df = apply_schema("enfrentamientos", enfrentamientos_df)
+        timer.rows = len(enfrentamientos_df)
     return enfrentamientos_df
 
-def get_resultados(enfrentamiento_id): 
+def get_resultados(enfrentamiento_id, categoria_api_id=None, fecha=None):
     #1. Get match results
-    result = get_data("GetPartidosEnfrentamientos", {'ide':enfrentamiento_id})
-    result_df = convert_to_dataframe(result)[[
-        "idpartido", "win", "nom11", "nom12", "nom21", "nom22",
-        "s11", "s12", "s21", "s22", "s31", "s32", "orden", "puntos"]]
-    #2. Rename columns
-    result_df = result_df.rename(columns={
-        "idpartido": "partido_api_id",
-        "win": "is_local_ganador",
-        "nom11": "nombre1_local",
-        "nom12": "nombre2_local",
-        "nom21": "nombre1_visitante",
-        "nom22": "nombre2_visitante",
-        "s11": "set1_local",
-        "s12": "set1_visitante",
-        "s21": "set2_local",
-        "s22": "set2_visitante",
-        "s31": "set3_local",
-        "s32": "set3_visitante",
-        "orden": "pista",
-        "puntos": "puntos"
-    })
-    #3. Add additional columns
-    result_df['fecha'] = my_date
-    result_df['enfrentamiento_api_id'] = enfrentamiento_id
-
-    #4. Apply corresponding data types
-    # Integers
-    int_columns = ['partido_api_id','set1_local', 'set1_visitante', 'set2_local', 'set2_visitante', 'set3_local', 'set3_visitante', 'puntos', 'pista']
-    for col in int_columns:
-        result_df[col] = result_df[col].apply(convert_to_int)
-    #Booleans
-    result_df['is_local_ganador'] = result_df['is_local_ganador'].apply(lambda x: True if int(x) == 1 else False)
-    
-    return result_df
\ No newline at end of file
+    with timed("extract", "resultados", categoria_api_id):
+        result = get_data("GetPartidosEnfrentamientos", {'ide':enfrentamiento_id})
+    with timed("transform", "resultados", categoria_api_id) as timer:
+        #2. Only the needed columns, already renamed
+        result_df = convert_to_dataframe(result, {
+            "idpartido": "partido_api_id",
+            "win": "is_local_ganador",
+            "nom11": "nombre1_local",
+            "nom12": "nombre2_local",
+            "nom21": "nombre1_visitante",
+            "nom22": "nombre2_visitante",
+            "s11": "set1_local",
+            "s12": "set1_visitante",
+            "s21": "set2_local",
+            "s22": "set2_visitante",
+            "s31": "set3_local",
+            "s32": "set3_visitante",
+            "orden": "pista",
+            "puntos": "puntos"
+        })
+        #3. Add additional columns
+        result_df['fecha'] = my_date if fecha is None else fecha
+        result_df['enfrentamiento_api_id'] = enfrentamiento_id
+
+        #4. Apply corresponding data types
+        # Integers
+        int_columns = ['partido_api_id','set1_local', 'set1_visitante', 'set2_local', 'set2_visitante', 'set3_local', 'set3_visitante', 'puntos', 'pista']
+        for col in int_columns:
+            result_df[col] = to_int(result_df[col])
+        #Booleans
+        result_df['is_local_ganador'] = to_flag(result_df['is_local_ganador'])
+
+        #5. Content hash ('fecha' is the snapshot date, not content)
+        result_df['row_hash'] = compute_row_hash(result_df, [
+            "partido_api_id", "is_local_ganador", "nombre1_local", "nombre2_local", "nombre1_visitante", "nombre2_visitante",
+            "set1_local", "set1_visitante", "set2_local", "set2_visitante", "set3_local", "set3_visitante", "pista", "puntos",
+            "enfrentamiento_api_id"])
+
+        timer.rows = len(result_df)
+    return result_df
+
+def iter_resultados(enfrentamiento_ids, batch_size, max_workers=API_MAX_WORKERS, categoria_api_id=None, fecha=None):
+    # Fetch resultados with at most `max_workers` requests in flight and yield them every `batch_size`
+    # enfrentamientos. executor.map keeps the input order, so batches come out in the same order as the ids.
+    enfrentamiento_ids = [int(id) for id in enfrentamiento_ids]  # plain ints for the JSON payload
+    if not enfrentamiento_ids:
+        return
+    fetch = partial(get_resultados, categoria_api_id=categoria_api_id, fecha=fecha)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        for start in range(0, len(enfrentamiento_ids), batch_size):
+            chunk = enfrentamiento_ids[start:start + batch_size]
+            resultados = pd.concat(executor.map(fetch, chunk), ignore_index=True)
+            # Declared dtypes (etl.schema) once per chunk: casting every 3-row frame costs ~30 ms of CPU each
+            with timed("transform", "resultados", categoria_api_id):
+                resultados = apply_schema("resultados", resultados)
+            yield resultados
+
+def get_all_resultados(enfrentamiento_ids, max_workers=API_MAX_WORKERS):
+    enfrentamiento_ids = list(enfrentamiento_ids)
+    if not enfrentamiento_ids:
+        return pd.DataFrame()
+    return concat_frames("resultados", iter_resultados(enfrentamiento_ids, len(enfrentamiento_ids), max_workers))
@@ -0,0 +1,189 @@
+import logging
+import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pandas as pd
+
+from .api_client import get_categorias, get_clubs, get_enfrentamientos, iter_resultados
+from .delta import filter_pending, get_loaded_state
+from .loaders import load_categorias
+from .pipeline import BatchLoader, with_resultado
+from .schema import apply_schema
+from .utils import APIError, convert_to_base64
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import API_MAX_WORKERS, RESULTADOS_CHUNK_SIZE, BACKFILL_WORKERS, BACKFILL_COMMIT_SHARDS
+from logger_config import Progress
+
+# Obtener el logger configurado
+logger = logging.getLogger('padel_etl')
+
+PLANNED_SQL = "SELECT competicion_api_id FROM backfill_competiciones WHERE competicion_api_id = ANY(%s);"
+
+# Shards still to do (pending, failed or interrupted), with their season's snapshot date
+SHARDS_SQL = """
+SELECT s.competicion_api_id, s.categoria_api_id, c.snapshot_date
+FROM backfill_shards s
+JOIN backfill_competiciones c USING (competicion_api_id)
+WHERE s.status <> 'done' AND s.competicion_api_id = ANY(%s)
+ORDER BY s.competicion_api_id, s.categoria_api_id;
+"""
+
+SHARD_DONE_SQL = """
+UPDATE backfill_shards SET status = 'done', filas = %s, attempts = attempts + 1, error = NULL, updated_at = now()
+WHERE competicion_api_id = %s AND categoria_api_id = %s;
+"""
+
+SHARD_FAILED_SQL = """
+UPDATE backfill_shards SET status = 'failed', attempts = attempts + 1, error = %s, updated_at = now()
+WHERE competicion_api_id = %s AND categoria_api_id = %s;
+"""
+
+
+def parse_competition_ids(values):
+    # "319" or ranges "250-318" (inclusive): the API only lists the competitions "en transcurso",
+    # so past seasons are found by scanning ids
+    ids = []
+    for value in values:
+        first, _, last = str(value).partition("-")
+        ids.extend(range(int(first), int(last or first) + 1))
+    return list(dict.fromkeys(ids))
+
+def season_snapshot(fechas_partido, today=None):
+    # A past season's rows are dated by its last enfrentamiento, as a run on that day would have dated them
+    today = today or date.today()
+    last = fechas_partido.max() if len(fechas_partido) else pd.NaT
+    return today if pd.isna(last) else min(last.date(), today)
+
+def plan_competition(conn, id, max_workers=API_MAX_WORKERS):
+    """
+    Register one competition id: its snapshot date, its categorias (loaded with that date) and one
+    pending shard per category. Returns the number of categories (0: nothing to backfill).
+    """
+    id_base64 = convert_to_base64(id)
+    categorias = get_categorias(id_base64)
+    categoria_ids = categorias['categoria_api_id'].tolist()
+    snapshot = None
+    if categoria_ids:
+        with ThreadPoolExecutor(max(1, max_workers)) as executor:
+            enfrentamientos = list(executor.map(lambda categoria: get_enfrentamientos(id_base64, categoria), categoria_ids))
+        snapshot = season_snapshot(pd.concat([frame['fecha_partido'] for frame in enfrentamientos]))
+        with conn.cursor() as cur:
+            load_categorias(cur, conn, apply_schema("categorias", categorias.assign(fecha=snapshot)))
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO backfill_competiciones (competicion_api_id, snapshot_date, categorias) VALUES (%s, %s, %s)
+            ON CONFLICT (competicion_api_id) DO NOTHING;
+        """, (id, snapshot, len(categoria_ids)))
+        cur.executemany("""
+            INSERT INTO backfill_shards (competicion_api_id, categoria_api_id) VALUES (%s, %s)
+            ON CONFLICT DO NOTHING;
+        """, [(id, int(categoria)) for categoria in categoria_ids])
+    conn.commit()
+    return len(categoria_ids)
+
+def extract_shard(shard, loaded_state, max_workers):
+    """(table, frame) pairs of one category of a past season, every row dated with the season's snapshot."""
+    id, categoria_api_id, snapshot = shard
+    id_base64 = convert_to_base64(id)
+    frames = [("clubs", get_clubs(id, categoria_api_id, fecha=snapshot))]
+    enfrentamientos = get_enfrentamientos(id_base64, categoria_api_id, fecha=snapshot)
+    frames.append(("enfrentamientos", enfrentamientos))
+    pendientes = filter_pending(with_resultado(enfrentamientos), loaded_state)
+    for resultados in iter_resultados(pendientes['enfrentamiento_api_id'], RESULTADOS_CHUNK_SIZE, max_workers,
+                                      categoria_api_id, fecha=snapshot):
+        frames.append(("resultados", resultados))
+    return frames
+
+def run_backfill(competition_ids, conn, workers=BACKFILL_WORKERS, commit_shards=BACKFILL_COMMIT_SHARDS):
+    """
+    Load past seasons, one shard (competition, category) at a time, resumably.
+
+    Up to `workers` shards are fetched at once (sharing API_MAX_WORKERS requests); their frames go to a
+    single BatchLoader. Every `commit_shards` shards the loader is flushed and those shards are marked
+    done in the same transaction, so an interrupted run only redoes the shards that were not committed.
+    A shard whose extraction fails is marked 'failed' and retried by the next run.
+
+    Returns:
+        BatchLoader with the rows and upsert stats of the run
+    """
+    ids = parse_competition_ids(competition_ids)
+    with conn.cursor() as cur:
+        cur.execute(PLANNED_SQL, (ids,))
+        planned = {row[0] for row in cur.fetchall()}
+    to_plan = [id for id in ids if id not in planned]
+    logger.info(f"🗄️ Backfill de {len(ids)} competiciones ({len(to_plan)} por planificar)")
+    progress = Progress(logger, "Planificación")
+    for id in to_plan:
+        try:
+            categorias = plan_competition(conn, id)
+        except APIError as e:
+            conn.rollback()
+            logger.error(f"❌ Error planificando la competición {id}: {e}")
+            continue
+        progress.update(competiciones=1, con_categorias=int(categorias > 0), categorias=categorias)
+    progress.flush()
+
+    with conn.cursor() as cur:
+        cur.execute(SHARDS_SQL, (ids,))
+        shards = cur.fetchall()
+        loaded_state = get_loaded_state(cur)
+    logger.info(f"🧩 {len(shards)} categorías pendientes en {workers} hilos")
+
+    workers = max(1, workers)
+    max_workers = max(1, API_MAX_WORKERS // workers)
+    counts = {'done': 0, 'failed': 0}
+    progress = Progress(logger, "Backfill")
+    with conn.cursor() as cur:
+        loader = BatchLoader(cur, conn)
+        finished = []
+
+        def commit_finished():
+            loader.flush_all()
+            cur.executemany(SHARD_DONE_SQL, [(rows, id, categoria) for id, categoria, rows in finished])
+            conn.commit()
+            counts['done'] += len(finished)
+            finished.clear()
+
+        # At most 2 * workers shards fetched ahead of the loader, so memory stays bounded
+        executor = ThreadPoolExecutor(workers)
+        try:
+            pending = deque()
+            queued = iter(shards)
+            for shard in queued:
+                pending.append((shard, executor.submit(extract_shard, shard, loaded_state, max_workers)))
+                if len(pending) >= 2 * workers:
+                    break
+            while pending:
+                (id, categoria, snapshot), future = pending.popleft()
+                next_shard = next(queued, None)
+                if next_shard is not None:
+                    pending.append((next_shard, executor.submit(extract_shard, next_shard, loaded_state, max_workers)))
+                try:
+                    frames = future.result()
+                except Exception as e:
+                    logger.error(f"❌ Error extrayendo la categoría {categoria} de la competición {id}: {e}")
+                    cur.execute(SHARD_FAILED_SQL, (str(e)[:500], id, categoria))
+                    commit_finished()
+                    counts['failed'] += 1
+                    continue
+                for table, frame in frames:
+                    loader.add(table, frame)
+                rows = sum(len(frame) for _, frame in frames)
+                finished.append((id, categoria, rows))
+                progress.update(categorias=1, filas=rows)
+                if len(finished) >= commit_shards:
+                    commit_finished()
+            commit_finished()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            progress.flush()
+
+    logger.info(f"🗄️ Backfill: {counts['done']} categorías completadas, {counts['failed']} con error")
+    return loader
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Obtener el logger configurado
+logger = logging.getLogger('padel_etl')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_content_hash ON responses (content_hash);
+CREATE TABLE IF NOT EXISTS blobs (
+    content_hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL
+);
+"""
+
+
+def cache_key(endpoint, payload):
+    canonical = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(f"{endpoint}|{canonical}".encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk cache of API responses keyed by endpoint + payload.
+
+    Responses are stored once per content hash under `blobs/`, so identical payloads returned
+    for different requests (empty lists, unchanged categories...) share the same file. A SQLite
+    index keeps the key -> blob mapping and the timestamps used for TTLs and LRU eviction.
+
+    Index writes are buffered in memory and committed together every `flush_every` writes or
+    `flush_seconds` (and by flush/close), with the eviction pass after each commit: the fetching
+    threads do not wait on one SQLite commit per response. A crash loses the buffered index rows
+    only; their blob files are rewritten by the next put of the same content.
+    """
+
+    def __init__(self, directory, max_bytes, flush_every=100, flush_seconds=5.0):
+        self.directory = directory
+        self.blobs_dir = os.path.join(directory, "blobs")
+        self.max_bytes = max_bytes
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite"), timeout=30, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        # Not yet committed: key -> responses row, content_hash -> size, key -> last_used
+        self._pending = {}
+        self._pending_blobs = {}
+        self._touched = {}
+        self._flushed_at = time.monotonic()
+
+    def _blob_path(self, content_hash):
+        return os.path.join(self.blobs_dir, f"{content_hash}.json")
+
+    def get(self, endpoint, payload, max_age=None):
+        """Cached response, or None if missing or older than `max_age` seconds (None = any age)."""
+        key = cache_key(endpoint, payload)
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None:
+                row = (pending[1], pending[2])
+            else:
+                row = self._db.execute("SELECT content_hash, fetched_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            content_hash, fetched_at = row
+            if max_age is not None and time.time() - fetched_at > max_age:
+                return None
+            try:
+                with open(self._blob_path(content_hash), "rb") as f:
+                    content = f.read()
+                    data = orjson.loads(content) if orjson is not None else json.loads(content)
+            except (OSError, ValueError):
+                self._pending.pop(key, None)
+                self._touched.pop(key, None)
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            if pending is not None:
+                self._pending[key] = pending[:3] + (time.time(),)
+            else:
+                self._touched[key] = time.time()
+            self._maybe_flush()
+            return data
+
+    def put(self, endpoint, payload, data):
+        content = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        content_hash = hashlib.sha256(content).hexdigest()
+        now = time.time()
+        key = cache_key(endpoint, payload)
+        with self._lock:
+            if content_hash not in self._pending_blobs and self._db.execute(
+                    "SELECT 1 FROM blobs WHERE content_hash = ?", (content_hash,)).fetchone() is None:
+                tmp_path = self._blob_path(content_hash) + f".{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(content)
+                os.replace(tmp_path, self._blob_path(content_hash))
+                self._pending_blobs[content_hash] = len(content)
+            self._pending[key] = (endpoint, content_hash, now, now)
+            self._touched.pop(key, None)
+            self._maybe_flush()
+
+    def _maybe_flush(self):
+        writes = len(self._pending) + len(self._touched)
+        if writes >= self.flush_every or (writes and time.monotonic() - self._flushed_at >= self.flush_seconds):
+            self._flush()
+
+    def flush(self):
+        """Commit the buffered index writes (and evict if the cache grew past max_bytes)."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        self._flushed_at = time.monotonic()
+        if not (self._pending or self._pending_blobs or self._touched):
+            return
+        self._db.executemany("INSERT OR REPLACE INTO blobs (content_hash, size) VALUES (?, ?)",
+                             list(self._pending_blobs.items()))
+        self._db.executemany(
+            "INSERT OR REPLACE INTO responses (key, endpoint, content_hash, fetched_at, last_used) "
+            "VALUES (?, ?, ?, ?, ?)", [(key, *row) for key, row in self._pending.items()])
+        self._db.executemany("UPDATE responses SET last_used = ? WHERE key = ?",
+                             [(last_used, key) for key, last_used in self._touched.items()])
+        self._db.commit()
+        grew = bool(self._pending_blobs)
+        self._pending.clear()
+        self._pending_blobs.clear()
+        self._touched.clear()
+        if grew:
+            self._evict()
+
+    def _evict(self):
+        # Drop least recently used responses until the distinct blobs fit in max_bytes
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        lru = self._db.execute("SELECT key, content_hash FROM responses ORDER BY last_used").fetchall()
+        for key, content_hash in lru:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            if self._db.execute("SELECT 1 FROM responses WHERE content_hash = ?", (content_hash,)).fetchone():
+                continue  # blob still shared by another response
+            size = self._db.execute("SELECT size FROM blobs WHERE content_hash = ?", (content_hash,)).fetchone()
+            self._db.execute("DELETE FROM blobs WHERE content_hash = ?", (content_hash,))
+            try:
+                os.remove(self._blob_path(content_hash))
+            except OSError:
+                pass
+            total -= size[0] if size else 0
+            if total <= self.max_bytes:
+                break
+        self._db.commit()
+        logger.debug(f"Caché reducida a {total / 1e6:.1f} MB")
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._db.close()
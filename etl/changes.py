@@ -0,0 +1,122 @@
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+
+from psycopg2.extensions import adapt
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CHANGES_DIR, CHANGES_IGNORED_COLUMNS, CHANGES_RETENTION_DAYS
+
+# Obtener el logger configurado
+logger = logging.getLogger('padel_etl')
+
+# Id of this run in the cambios table; main.py sets it to the timestamp of the run's log file, the daemon
+# to a new timestamp every cycle (new_run_id)
+_run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+RUN_COUNTS_SQL = """
+SELECT tabla, operacion, count(*) FROM cambios WHERE run_id = %s GROUP BY tabla, operacion ORDER BY tabla, operacion;
+"""
+RUN_EVENTS_SQL = """
+SELECT id, tabla, operacion, clave, antes, despues, creado_at FROM cambios WHERE run_id = %s ORDER BY id;
+"""
+
+
+def set_run_id(run_id):
+    global _run_id
+    _run_id = run_id
+
+def get_run_id():
+    return _run_id
+
+def new_run_id():
+    set_run_id(datetime.now().strftime('%Y%m%d_%H%M%S'))
+    return _run_id
+
+def with_changes(table, upsert, conflict_columns):
+    """
+    Wrap an upsert (INSERT ... ON CONFLICT, without RETURNING) so that the rows it writes are also
+    recorded in the cambios outbox, in the same statement. Returns one (inserted,) row per written row.
+
+    Inserts only record their key (the row itself is in the table). Updates also record the old and new
+    values of the columns that changed, CHANGES_IGNORED_COLUMNS (e.g. the load date) left out: the WITH
+    sub-statements and the main query share one snapshot, so `old` still sees the row as it was before.
+    """
+    run_id = adapt(_run_id).getquoted().decode()
+    key = ", ".join(f"'{col}', ups.{col}" for col in conflict_columns)
+    join = " AND ".join(f"old.{col} = ups.{col}" for col in conflict_columns)
+    ignored = "".join(f" - '{col}'" for col in ["inserted", *CHANGES_IGNORED_COLUMNS])
+    return f"""
+    WITH ups AS (
+        {upsert}
+        RETURNING {table}.*, (xmax = 0) AS inserted
+    ), inserts AS (
+        INSERT INTO cambios (run_id, tabla, operacion, clave)
+        SELECT {run_id}, '{table}', 'insert', jsonb_build_object({key})
+        FROM ups
+        WHERE ups.inserted
+    ), updates AS (
+        INSERT INTO cambios (run_id, tabla, operacion, clave, antes, despues)
+        SELECT {run_id}, '{table}', 'update', jsonb_build_object({key}), d.antes, d.despues
+        FROM ups
+        JOIN {table} AS old ON {join}
+        CROSS JOIN LATERAL (
+            SELECT jsonb_object_agg(n.key, o.value) AS antes, jsonb_object_agg(n.key, n.value) AS despues
+            FROM jsonb_each(to_jsonb(ups){ignored}) AS n
+            JOIN jsonb_each(to_jsonb(old)) AS o ON o.key = n.key
+            WHERE o.value IS DISTINCT FROM n.value
+        ) AS d
+        WHERE NOT ups.inserted AND d.despues IS NOT NULL
+    )
+    SELECT inserted FROM ups;
+    """
+
+def log_run_changes(cursor, run_id=None):
+    """Log and return the events recorded by the run, as {tabla: {operacion: n}}."""
+    cursor.execute(RUN_COUNTS_SQL, (run_id or _run_id,))
+    counts = {}
+    for tabla, operacion, n in cursor.fetchall():
+        counts.setdefault(tabla, {})[operacion] = n
+    total = sum(n for operaciones in counts.values() for n in operaciones.values())
+    logger.info(f"📣 {total} cambios registrados (run_id {run_id or _run_id}):")
+    for tabla, operaciones in counts.items():
+        logger.info(f"   {tabla}: " + ", ".join(f"{n} {operacion}" for operacion, n in operaciones.items()))
+    return counts
+
+def export_changes(connection, path, run_id=None, chunk_size=10000):
+    """
+    Write the events of a run to `path` as JSON lines, streamed through a server-side cursor.
+    Returns the number of events written.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    written = 0
+    with connection.cursor(name="cambios_export") as cursor, open(tmp_path, 'w', encoding='utf-8') as f:
+        cursor.itersize = chunk_size
+        cursor.execute(RUN_EVENTS_SQL, (run_id or _run_id,))
+        for id, tabla, operacion, clave, antes, despues, creado_at in cursor:
+            f.write(json.dumps({"id": id, "tabla": tabla, "operacion": operacion, "clave": clave, "antes": antes,
+                                "despues": despues, "creado_at": creado_at.isoformat()}, ensure_ascii=False) + "\n")
+            written += 1
+    os.replace(tmp_path, path)
+    logger.info(f"📣 {written} cambios exportados a {path}")
+    return written
+
+def prune_changes(cursor, retention_days):
+    # Outbox rows older than the retention, which every consumer has had time to read
+    cursor.execute("DELETE FROM cambios WHERE creado_at < now() - %s * interval '1 day';", (retention_days,))
+    if cursor.rowcount:
+        logger.info(f"🧹 {cursor.rowcount} cambios de más de {retention_days} días eliminados")
+    return cursor.rowcount
+
+def publish_changes(connection):
+    # Events this run recorded in the cambios outbox: logged, exported to CHANGES_DIR, expired ones pruned
+    with connection.cursor() as cursor:
+        counts = log_run_changes(cursor)
+        prune_changes(cursor, CHANGES_RETENTION_DAYS)
+    connection.commit()
+    if CHANGES_DIR and counts:
+        export_changes(connection, os.path.join(CHANGES_DIR, f"cambios_{_run_id}.jsonl"))
+    return counts
@@ -0,0 +1,174 @@
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+
+import pandas as pd
+
+from .delta import build_state
+from .pipeline import extract_competitions
+
+try:
+    import pyarrow  # noqa: F401 (Parquet engine used by pandas)
+except ImportError:
+    pyarrow = None
+
+# Obtener el logger configurado
+logger = logging.getLogger('padel_etl')
+
+MANIFEST_FILE = "manifest.json"
+PARTS_FILE = "parts.jsonl"
+
+EXTRACTING = "extracting"
+EXTRACTED = "extracted"
+
+
+def checkpoints_available():
+    return pyarrow is not None
+
+
+class Checkpoint:
+    """
+    The frames extracted by a run, one Parquet file per table and category, so that a failed load
+    can be retried with --resume without calling the API again.
+
+    manifest.json holds the run (competitions, status) and parts.jsonl one line per frame written,
+    appended only once its file is complete: a run killed mid-write leaves a readable checkpoint.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._manifest = None
+        self._sequence = None
+        self._categoria_by_enfrentamiento = {}
+
+    @classmethod
+    def create(cls, directory, competitions):
+        # Start a new checkpoint, replacing the previous run's one
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+        checkpoint = cls(directory)
+        checkpoint._manifest = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'competitions': [list(competition) for competition in competitions],
+            'status': EXTRACTING,
+        }
+        checkpoint._write_manifest()
+        return checkpoint
+
+    @classmethod
+    def open(cls, directory):
+        # Checkpoint left by a previous run, or None if there is none
+        if not os.path.exists(os.path.join(directory, MANIFEST_FILE)):
+            return None
+        return cls(directory)
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            with open(os.path.join(self.directory, MANIFEST_FILE), encoding='utf-8') as f:
+                self._manifest = json.load(f)
+        return self._manifest
+
+    @property
+    def competitions(self):
+        return [tuple(competition) for competition in self.manifest['competitions']]
+
+    @property
+    def complete(self):
+        return self.manifest['status'] == EXTRACTED
+
+    def _write_manifest(self):
+        path = os.path.join(self.directory, MANIFEST_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def parts(self):
+        path = os.path.join(self.directory, PARTS_FILE)
+        if not os.path.exists(path):
+            return []
+        parts = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    parts.append(json.loads(line))
+                except ValueError:
+                    break  # last line cut short by a crash
+        return parts
+
+    def _categoria(self, table, frame):
+        # Category of a frame, for the file name; resultados only carry their enfrentamiento
+        if table in ("clubs", "enfrentamientos"):
+            categoria = frame['categoria_api_id'].iloc[0]
+            if table == "enfrentamientos":
+                self._categoria_by_enfrentamiento.update(dict.fromkeys(frame['enfrentamiento_api_id'].tolist(), categoria))
+            return categoria
+        if table == "resultados":
+            return self._categoria_by_enfrentamiento.get(frame['enfrentamiento_api_id'].iloc[0], "unknown")
+        return "all"
+
+    def write(self, table, frame):
+        if frame.empty:
+            return
+        if self._sequence is None:
+            self._sequence = len(self.parts())
+        file_name = f"{self._sequence:06d}_{table}_{self._categoria(table, frame)}.parquet"
+        path = os.path.join(self.directory, file_name)
+        frame.to_parquet(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+        with open(os.path.join(self.directory, PARTS_FILE), 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'table': table, 'file': file_name, 'rows': len(frame)}) + "\n")
+        self._sequence += 1
+
+    def record(self, source):
+        # Pass (table, frame) pairs through, writing each frame; the checkpoint is only marked
+        # complete when the source is exhausted
+        for table, frame in source:
+            self.write(table, frame)
+            yield table, frame
+        self.manifest['status'] = EXTRACTED
+        self._write_manifest()
+
+    def iter_frames(self):
+        for part in self.parts():
+            frame = pd.read_parquet(os.path.join(self.directory, part['file']))
+            if part['table'] == "enfrentamientos":
+                self._categoria_by_enfrentamiento.update(
+                    dict.fromkeys(frame['enfrentamiento_api_id'].tolist(), frame['categoria_api_id'].iloc[0]))
+            yield part['table'], frame
+
+    def fetched_state(self):
+        # Incremental state of the resultados already in the checkpoint (see etl.delta)
+        frames = {"enfrentamientos": [], "resultados": []}
+        for part in self.parts():
+            if part['table'] not in frames:
+                continue
+            columns = ['enfrentamiento_api_id', 'resultado'] if part['table'] == "enfrentamientos" else ['enfrentamiento_api_id']
+            frames[part['table']].append(pd.read_parquet(os.path.join(self.directory, part['file']), columns=columns))
+        if not frames["enfrentamientos"] or not frames["resultados"]:
+            return {}
+        return build_state(pd.concat(frames["enfrentamientos"], ignore_index=True),
+                           pd.concat(frames["resultados"], ignore_index=True))
+
+    def remove(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def extraction_source(checkpoint, competitions, loaded_state, fetched_state, processes):
+    """
+    The (table, frame) pairs of a run, written to `checkpoint` as they are extracted.
+
+    When the checkpoint already holds frames (--resume) those are replayed first. If the previous
+    extraction had finished, nothing is fetched; otherwise extraction runs again and the incremental
+    state skips the resultados that were already checkpointed.
+    """
+    if checkpoint.parts():
+        fetched_state.update(checkpoint.fetched_state())
+        yield from checkpoint.iter_frames()
+        if checkpoint.complete:
+            return
+        loaded_state = {**loaded_state, **fetched_state}
+    yield from checkpoint.record(extract_competitions(competitions, loaded_state, fetched_state, processes))
@@ -1 +1,69 @@
-Se puede usar ON CONFLICT DO NOTHING o comparar un hash de fila para evitar duplicados.
\ No newline at end of file
+import json
+import logging
+import os
+
+# Obtener el logger configurado
+logger = logging.getLogger('padel_etl')
+
+# Enfrentamientos whose resultados are already loaded, with the resultado string they had then.
+# resultado_cargado is written by load_resultados in the same transaction as the resultados: the
+# resultado column itself is committed earlier, with the enfrentamientos, and a run that fails before
+# loading the resultados would otherwise leave them marked as loaded. Enfrentamientos with resultados sent to
+# cuarentena lose their state, so they are fetched again until all their partidos load.
+LOADED_STATE_SQL = """
+SELECT enfrentamiento_api_id, resultado_cargado
+FROM enfrentamientos
+WHERE resultado_cargado IS NOT NULL;
+"""
+MARK_LOADED_SQL = """
+UPDATE enfrentamientos
+SET resultado_cargado = CASE WHEN enfrentamiento_api_id = ANY(%(incomplete)s) THEN NULL ELSE resultado END
+WHERE enfrentamiento_api_id = ANY(%(ids)s)
+  AND resultado_cargado IS DISTINCT FROM
+      CASE WHEN enfrentamiento_api_id = ANY(%(incomplete)s) THEN NULL ELSE resultado END;
+"""
+
+
+def get_loaded_state(cursor):
+    # {enfrentamiento_api_id: resultado} of the enfrentamientos that already have resultados in the DB
+    cursor.execute(LOADED_STATE_SQL)
+    return {int(enfrentamiento_id): resultado for enfrentamiento_id, resultado in cursor.fetchall()}
+
+def mark_loaded(cursor, enfrentamiento_ids, incomplete=()):
+    # The enfrentamientos whose resultados are being loaded by the caller's transaction (sorted: same lock order
+    # in concurrent runs) take their stored resultado string as loaded state; the `incomplete` ones, with
+    # resultados rejected by the validation, are left without state
+    incomplete = {int(id) for id in incomplete}
+    ids = sorted({int(id) for id in enfrentamiento_ids} | incomplete)
+    if ids:
+        cursor.execute(MARK_LOADED_SQL, {"ids": ids, "incomplete": sorted(incomplete)})
+
+def read_state_file(path):
+    if not os.path.exists(path):
+        logger.warning(f"No existe el fichero de estado {path}, se descargarán todos los resultados")
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return {int(enfrentamiento_id): resultado for enfrentamiento_id, resultado in json.load(f).items()}
+
+def write_state_file(path, state):
+    # Write to a temporary file first so an interrupted run never leaves a truncated state file
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({str(k): v for k, v in state.items()}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def build_state(enfrentamientos, resultados):
+    # Only enfrentamientos that actually got resultados count as loaded
+    if resultados.empty:
+        return {}
+    loaded = enfrentamientos[enfrentamientos['enfrentamiento_api_id'].isin(resultados['enfrentamiento_api_id'])]
+    return dict(zip(loaded['enfrentamiento_api_id'].astype(int), loaded['resultado']))
+
+def filter_pending(enfrentamientos, loaded_state):
+    # Keep the enfrentamientos that are new or whose resultado string changed since the last load
+    if not loaded_state:
+        return enfrentamientos
+    previous = enfrentamientos['enfrentamiento_api_id'].map(loaded_state)
+    pending = previous.isna() | (previous != enfrentamientos['resultado'])
+    return enfrentamientos[pending]
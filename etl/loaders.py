@@ -1,136 +1,242 @@
 from psycopg2.extras import execute_values
+import pandas as pd
+import io
 import logging
+import os
+import sys
+
+from .aggregates import lock_aggregates, move_enfrentamientos, update_aggregates
+from .changes import with_changes
+from .delta import mark_loaded
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import LOAD_BACKEND, LOAD_BACKENDS, LOAD_PAGE_SIZE, AGGREGATES_ENABLED, CHANGES_ENABLED
 
 # Obtener el logger configurado
 logger = logging.getLogger('padel_etl')
 
+# Column order sent to each table (the DataFrames are reordered to match)
+CATEGORIAS_COLUMNS = ["categoria_api_id", "nombre", "genero", "fecha", "row_hash"]
+CLUBS_COLUMNS = ["nombre", "categoria_api_id", "fecha", "row_hash"]
+ENFRENTAMIENTOS_COLUMNS = ["fecha_partido", "resultado", "club_local_id", "club_visitante_id", "jornada",
+                           "enfrentamiento_api_id", "fecha", "categoria_api_id", "row_hash"]
+RESULTADOS_COLUMNS = ["partido_api_id", "is_local_ganador", "jugador1_local_id", "jugador2_local_id",
+                      "jugador1_visitante_id", "jugador2_visitante_id", "set1_local", "set1_visitante", "set2_local",
+                      "set2_visitante", "set3_local", "set3_visitante", "pista", "puntos", "fecha",
+                      "enfrentamiento_api_id", "row_hash"]
+
+# Player name columns of the extracted resultados and the jugadores.id column each one is stored as
+JUGADOR_COLUMNS = {
+    "nombre1_local": "jugador1_local_id",
+    "nombre2_local": "jugador2_local_id",
+    "nombre1_visitante": "jugador1_visitante_id",
+    "nombre2_visitante": "jugador2_visitante_id",
+}
+
+# jugadores.nombre -> jugadores.id, kept for the life of the process (the daemon reuses it between polls)
+_jugador_ids = {}
+
+
+def build_upsert_sql(table, columns, conflict_columns, update_columns, source="VALUES %s"):
+    # Rows whose stored row_hash matches are left untouched: no new tuple, no WAL.
+    # RETURNING only reports the rows actually written; xmax = 0 means the row was inserted.
+    upsert = f"""
+    INSERT INTO {table} ({', '.join(columns)})
+    {source}
+    ON CONFLICT ({', '.join(conflict_columns)}) DO UPDATE
+    SET {', '.join(f'{col} = EXCLUDED.{col}' for col in update_columns)}
+    WHERE {table}.row_hash IS DISTINCT FROM EXCLUDED.row_hash
+    """
+    if CHANGES_ENABLED:
+        # Same (inserted,) rows, and the written rows also go to the cambios outbox
+        return with_changes(table, upsert, conflict_columns)
+    return upsert + "RETURNING (xmax = 0) AS inserted;"
+
+def get_backend(table):
+    return LOAD_BACKENDS.get(table, LOAD_BACKEND)
+
+def column_values(series):
+    # Python scalars for psycopg2, with None for NA/NaN/NaT (which it does not take as NULL)
+    if series.dtype.kind == "M":
+        return series.to_numpy().tolist()  # datetime.datetime and None for NaT, ~10x faster than Timestamps
+    values = series.tolist()
+    if series.hasnans:
+        values = [None if missing else value for value, missing in zip(values, series.isna().tolist())]
+    return values
+
+def values_upsert(cursor, table, df, columns, conflict_columns, update_columns):
+    sql = build_upsert_sql(table, columns, conflict_columns, update_columns)
+    # Column by column, straight from the typed arrays: no object copy of the whole frame
+    values = list(zip(*(column_values(df[col]) for col in columns)))
+    return upsert_stats(execute_values(cursor, sql, values, page_size=LOAD_PAGE_SIZE, fetch=True), len(values))
+
+def copy_upsert(cursor, table, df, columns, conflict_columns, update_columns):
+    # Stream the frame as CSV into a staging table with the target's column types, then merge it in one statement
+    staging = f"staging_{table}"
+    cursor.execute(f"""
+    CREATE TEMP TABLE IF NOT EXISTS {staging} ON COMMIT DROP AS
+    SELECT {', '.join(columns)} FROM {table} WITH NO DATA;
+    TRUNCATE {staging};
+    """)
+
+    # Integer columns that picked up NaN are float64; write them as ints so COPY accepts them
+    frame = df[columns]
+    integral = [col for col in frame.select_dtypes('float').columns
+                if (frame[col].dropna() % 1 == 0).all()]
+    if integral:
+        frame = frame.astype({col: 'Int64' for col in integral})
+
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False, na_rep='\\N')
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {staging} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+
+    source = f"SELECT {', '.join(columns)} FROM {staging}"
+    cursor.execute(build_upsert_sql(table, columns, conflict_columns, update_columns, source=source))
+    return upsert_stats(cursor.fetchall(), len(df))
+
+def upsert_dataframe(cursor, table, df, columns, conflict_columns, update_columns):
+    upsert = copy_upsert if get_backend(table) == "copy" else values_upsert
+    return upsert(cursor, table, df, columns, conflict_columns, update_columns)
+
+def upsert_stats(returned, total):
+    inserted = sum(1 for (is_insert,) in returned if is_insert)
+    updated = len(returned) - inserted
+    return {'inserted': inserted, 'updated': updated, 'unchanged': total - len(returned)}
+
+def format_stats(stats):
+    return f"{stats['inserted']} insertados, {stats['updated']} actualizados, {stats['unchanged']} sin cambios"
+
 def load_categorias(cursor, connection, categorias):
     if categorias.empty:
         logger.warning("No hay categorías para insertar.")
-        return
-
-    sql = """
-    INSERT INTO categorias (categoria_api_id, nombre, genero, fecha)
-    VALUES %s
-    ON CONFLICT (categoria_api_id) DO UPDATE
-    SET fecha = EXCLUDED.fecha;
-    """
+        return upsert_stats([], 0)
 
-    values = [tuple(row) for row in categorias.values]
-    logger.info(f"Iniciando carga de {len(values)} categorías")
+    logger.debug(f"Iniciando carga de {len(categorias)} categorías ({get_backend('categorias')})")
 
     try:
-        execute_values(cursor, sql, values)
+        stats = upsert_dataframe(cursor, "categorias", categorias, CATEGORIAS_COLUMNS, ["categoria_api_id"],
+                                 ["nombre", "genero", "fecha", "row_hash"])
         connection.commit()
-        logger.info(f"✅ Procesadas {len(values)} categorías (insertadas/actualizadas).")
+        logger.info(f"✅ Procesadas {len(categorias)} categorías ({format_stats(stats)}).")
+        return stats
     except Exception as e:
         connection.rollback()
         logger.error(f"❌ Error insertando categorías: {e}")
-        logger.debug(f"SQL que falló: {sql}")
-        logger.debug(f"Primeros 3 valores: {values[:3]}")
+        logger.debug(f"Primeros 3 valores: {categorias[CATEGORIAS_COLUMNS].head(3).values.tolist()}")
         raise  # Re-lanzar la excepción para que se maneje arriba
 
 def load_clubs(cursor, connection, clubs):
     if clubs.empty:
         logger.warning("No hay clubes para insertar.")
-        return
+        return upsert_stats([], 0)
 
-    sql = """
-    INSERT INTO clubs (nombre, categoria_api_id, fecha)
-    VALUES %s
-    ON CONFLICT (nombre, categoria_api_id) DO UPDATE
-    SET fecha = EXCLUDED.fecha;
-    """
-
-    values = [tuple(row) for row in clubs.values]
-    logger.info(f"Iniciando carga de {len(values)} clubs")
+    logger.debug(f"Iniciando carga de {len(clubs)} clubs ({get_backend('clubs')})")
 
     try:
-        execute_values(cursor, sql, values)
+        # The hash only covers the conflict key, so existing clubs are never rewritten
+        stats = upsert_dataframe(cursor, "clubs", clubs, CLUBS_COLUMNS, ["nombre", "categoria_api_id"],
+                                 ["fecha", "row_hash"])
         connection.commit()
-        logger.info(f"✅ Procesados {len(values)} clubes (insertados/actualizados).")
+        logger.info(f"✅ Procesados {len(clubs)} clubes ({format_stats(stats)}).")
+        return stats
     except Exception as e:
         connection.rollback()
         logger.error(f"❌ Error insertando clubes: {e}")
-        logger.debug(f"SQL que falló: {sql}")
-        logger.debug(f"Primeros 3 valores: {values[:3]}")
+        logger.debug(f"Primeros 3 valores: {clubs[CLUBS_COLUMNS].head(3).values.tolist()}")
         raise
 
 def load_enfrentamientos(cursor, connection, enfrentamientos):
     if enfrentamientos.empty:
         logger.warning("No hay enfrentamientos para insertar.")
-        return
-    
+        return upsert_stats([], 0)
+
     # Log detallado para debug
-    logger.info(f"Iniciando carga de {len(enfrentamientos)} enfrentamientos")
+    logger.debug(f"Iniciando carga de {len(enfrentamientos)} enfrentamientos ({get_backend('enfrentamientos')})")
     logger.debug(f"Columnas del DataFrame: {list(enfrentamientos.columns)}")
     logger.debug(f"Tipos de datos: {enfrentamientos.dtypes.to_dict()}")
-    
-    sql = """
-    INSERT INTO enfrentamientos (fecha_partido, resultado, club_local_id, club_visitante_id, jornada, enfrentamiento_api_id, fecha, categoria_api_id)
-    VALUES %s
-    ON CONFLICT (enfrentamiento_api_id) DO UPDATE
-    SET club_local_id = EXCLUDED.club_local_id,
-        club_visitante_id = EXCLUDED.club_visitante_id,
-        fecha = EXCLUDED.fecha,
-        fecha_partido = EXCLUDED.fecha_partido,
-        resultado = EXCLUDED.resultado;
-    """
-
-    values = [tuple(row) for row in enfrentamientos.values]
-    logger.debug(f"Primer registro a insertar: {values[0] if values else 'Sin datos'}")
 
     try:
-        execute_values(cursor, sql, values)
+        if AGGREGATES_ENABLED:
+            # Standings of enfrentamientos changing category or clubs move with them, before the upsert overwrites them
+            move_enfrentamientos(cursor, enfrentamientos)
+        stats = upsert_dataframe(cursor, "enfrentamientos", enfrentamientos, ENFRENTAMIENTOS_COLUMNS,
+                                 ["enfrentamiento_api_id"],
+                                 [col for col in ENFRENTAMIENTOS_COLUMNS if col != "enfrentamiento_api_id"])
         connection.commit()
-        logger.info(f"✅ Procesados {len(values)} enfrentamientos (insertados/actualizados).")
+        logger.info(f"✅ Procesados {len(enfrentamientos)} enfrentamientos ({format_stats(stats)}).")
+        return stats
     except Exception as e:
         connection.rollback()
         logger.error(f"❌ Error insertando enfrentamientos: {e}")
-        logger.debug(f"SQL que falló: {sql}")
-        logger.debug(f"Primeros 3 valores: {values[:3]}")
+        logger.debug(f"Primeros 3 valores: {enfrentamientos[ENFRENTAMIENTOS_COLUMNS].head(3).values.tolist()}")
         # Log adicional para enfrentamientos por ser más complejo
-        logger.error(f"Orden de columnas esperado: fecha_partido, resultado, club_local_id, club_visitante_id, jornada, enfrentamiento_api_id, fecha, categoria_api_id")
+        logger.error(f"Orden de columnas esperado: {', '.join(ENFRENTAMIENTOS_COLUMNS)}")
         logger.error(f"Orden de columnas en DataFrame: {list(enfrentamientos.columns)}")
         raise
 
-def load_resultados(cursor, connection, resultados):
+def intern_jugadores(cursor, resultados):
+    """
+    Replace the player names of `resultados` with their jugadores ids (the jugador*_id columns).
+
+    Names already in the process cache cost nothing; the rest are inserted into jugadores in one
+    statement (or found there, if an earlier run added them) and fetched back in another. Returns the
+    frame and the names added to the cache, to be dropped again if the transaction is rolled back.
+    """
+    names = {col: resultados[col].str.strip() for col in JUGADOR_COLUMNS}
+    names = {col: values.where(values != '') for col, values in names.items()}
+    unknown = set(pd.unique(pd.concat(names.values()).dropna())) - _jugador_ids.keys()
+    new_ids = {}
+    if unknown:
+        unknown = sorted(unknown)  # same lock order in concurrent runs
+        cursor.execute("INSERT INTO jugadores (nombre) SELECT unnest(%s::text[]) ON CONFLICT (nombre) DO NOTHING;",
+                       (unknown,))
+        cursor.execute("SELECT nombre, id FROM jugadores WHERE nombre = ANY(%s);", (unknown,))
+        new_ids = dict(cursor.fetchall())
+        _jugador_ids.update(new_ids)
+    ids = {JUGADOR_COLUMNS[col]: values.map(_jugador_ids).astype('Int32') for col, values in names.items()}
+    return resultados.assign(**ids), list(new_ids)
+
+def forget_jugadores(names=None):
+    # Drop names from the cache (all of them if None), e.g. after a rollback or when the tables are recreated
+    if names is None:
+        _jugador_ids.clear()
+    for name in names or []:
+        _jugador_ids.pop(name, None)
+
+def load_resultados(cursor, connection, resultados, incomplete=()):
+    # incomplete: enfrentamiento_api_id of the resultados the validation sent to cuarentena
     if resultados.empty:
         logger.warning("No hay resultados para insertar.")
-        return
-    
-    logger.info(f"Iniciando carga de {len(resultados)} resultados")
-    
-    sql = """
-    INSERT INTO resultados (partido_api_id, is_local_ganador, nombre1_local, nombre2_local, nombre1_visitante, nombre2_visitante, set1_local, set1_visitante, set2_local, set2_visitante, set3_local, set3_visitante, pista, puntos, fecha, enfrentamiento_api_id)
-    VALUES %s
-    ON CONFLICT (partido_api_id) DO UPDATE
-    SET is_local_ganador = EXCLUDED.is_local_ganador,
-        nombre1_local = EXCLUDED.nombre1_local,
-        nombre2_local = EXCLUDED.nombre2_local,
-        nombre1_visitante = EXCLUDED.nombre1_visitante,
-        nombre2_visitante = EXCLUDED.nombre2_visitante,
-        set1_local = EXCLUDED.set1_local,
-        set1_visitante = EXCLUDED.set1_visitante,
-        set2_local = EXCLUDED.set2_local,
-        set2_visitante = EXCLUDED.set2_visitante,
-        set3_local = EXCLUDED.set3_local,
-        set3_visitante = EXCLUDED.set3_visitante,
-        pista = EXCLUDED.pista,
-        puntos = EXCLUDED.puntos,
-        fecha = EXCLUDED.fecha,
-        enfrentamiento_api_id = EXCLUDED.enfrentamiento_api_id;
-    """
+        if len(incomplete):
+            mark_loaded(cursor, [], incomplete)
+            connection.commit()
+        return upsert_stats([], 0)
 
-    values = [tuple(row) for row in resultados.values]
+    logger.debug(f"Iniciando carga de {len(resultados)} resultados ({get_backend('resultados')})")
 
+    new_jugadores = []
     try:
-        execute_values(cursor, sql, values)
+        if AGGREGATES_ENABLED:
+            # Concurrent runs load resultados one at a time, waiting before any write (see lock_aggregates)
+            lock_aggregates(cursor)
+        # Players first, in the same transaction: resultados reference them by id
+        resultados, new_jugadores = intern_jugadores(cursor, resultados)
+        if AGGREGATES_ENABLED:
+            # Standings and player stats move with the rows about to change, before the upsert overwrites them
+            update_aggregates(cursor, resultados)
+        stats = upsert_dataframe(cursor, "resultados", resultados, RESULTADOS_COLUMNS, ["partido_api_id"],
+                                 [col for col in RESULTADOS_COLUMNS if col != "partido_api_id"])
+        # Incremental extraction state, committed together with the resultados it describes
+        mark_loaded(cursor, resultados['enfrentamiento_api_id'].dropna(), incomplete)
         connection.commit()
-        logger.info(f"✅ Procesados {len(values)} resultados (insertados/actualizados).")
+        if new_jugadores:
+            logger.info(f"   {len(new_jugadores)} jugadores nuevos en caché ({len(_jugador_ids)} en total)")
+        logger.info(f"✅ Procesados {len(resultados)} resultados ({format_stats(stats)}).")
+        return stats
     except Exception as e:
         connection.rollback()
+        forget_jugadores(new_jugadores)
         logger.error(f"❌ Error insertando resultados: {e}")
-        logger.debug(f"SQL que falló: {sql}")
-        logger.debug(f"Primeros 3 valores: {values[:3]}")
-        raise
\ No newline at end of file
+        logger.debug(f"Primeros 3 valores: {resultados.head(3).values.tolist()}")
+        raise
@@ -0,0 +1,210 @@
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Obtener el logger configurado
+logger = logging.getLogger('padel_etl')
+
+# Upper bounds (ms) of the HTTP latency histogram buckets; slower responses go to the last, open one
+LATENCY_BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+# Run metrics, shared by all threads: stage timings, HTTP histogram and memory peaks of the worker processes
+_lock = threading.Lock()
+_stages = {}
+_http = {}
+_worker_memory = []
+_started_at = None
+
+# Profiling (--profile): one cProfile per stage. Profiled blocks are serialized with a global lock,
+# so each profile only sees its own stage even though the pipeline runs several threads.
+_profiles = None
+_profile_lock = threading.RLock()
+_profiling = threading.local()
+
+
+def start(trace_memory=True, profile=False):
+    global _started_at, _profiles
+    _started_at = datetime.now()
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if profile:
+        _profiles = {}
+
+
+class _StageTimer:
+    def __init__(self):
+        self.rows = 0
+
+
+def _start_profile(stage):
+    if _profiles is None or getattr(_profiling, 'active', False):
+        return None
+    _profile_lock.acquire()
+    _profiling.active = True
+    profile = _profiles.setdefault(stage, cProfile.Profile())
+    profile.enable()
+    return profile
+
+def _stop_profile(profile):
+    if profile is None:
+        return
+    profile.disable()
+    _profiling.active = False
+    _profile_lock.release()
+
+@contextmanager
+def timed(stage, table, categoria=None):
+    """
+    Time a block of the given stage ('extract', 'transform' or 'load') for a table, optionally
+    per category. Set `.rows` on the yielded timer to get rows/s in the report.
+
+    Blocks run concurrently in several threads, so their wall times add up to more than the run;
+    cpu_seconds (CPU time of the block's thread) is the figure to compare for CPU-bound stages.
+    """
+    timer = _StageTimer()
+    profile = _start_profile(stage)
+    start_time = time.perf_counter()
+    start_cpu = time.thread_time()
+    try:
+        yield timer
+    finally:
+        elapsed = time.perf_counter() - start_time
+        cpu = time.thread_time() - start_cpu
+        _stop_profile(profile)
+        with _lock:
+            entry = _stage_entry(_stages.setdefault(stage, {}), table)
+            _add_timing(entry, elapsed, cpu, timer.rows)
+            if categoria is not None:
+                _add_timing(_stage_entry(entry.setdefault('by_categoria', {}), str(categoria)), elapsed, cpu, timer.rows)
+
+def _stage_entry(entries, key):
+    return entries.setdefault(key, {'calls': 0, 'seconds': 0.0, 'cpu_seconds': 0.0, 'rows': 0})
+
+def _add_timing(entry, seconds, cpu_seconds, rows):
+    entry['calls'] += 1
+    entry['seconds'] += seconds
+    entry['cpu_seconds'] += cpu_seconds
+    entry['rows'] += rows
+
+
+def _latency_bucket(elapsed):
+    elapsed_ms = elapsed * 1000
+    for bound in LATENCY_BUCKETS_MS:
+        if elapsed_ms <= bound:
+            return f"<={bound}ms"
+    return f">{LATENCY_BUCKETS_MS[-1]}ms"
+
+def record_http(endpoint, elapsed, size, status=None):
+    # One HTTP attempt: latency bucket, bytes received and status code (None when there was no response)
+    with _lock:
+        entry = _http.setdefault(endpoint, {'requests': 0, 'bytes': 0, 'seconds': 0.0, 'status': {},
+                                            'latency_ms': {}})
+        entry['requests'] += 1
+        entry['bytes'] += size
+        entry['seconds'] += elapsed
+        status = str(status) if status is not None else 'error'
+        entry['status'][status] = entry['status'].get(status, 0) + 1
+        bucket = _latency_bucket(elapsed)
+        entry['latency_ms'][bucket] = entry['latency_ms'].get(bucket, 0) + 1
+
+
+def memory_usage():
+    # Peak Python allocations (tracemalloc, when tracing) and peak RSS of this process, in bytes
+    usage = {'tracemalloc_peak_bytes': tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None,
+             'max_rss_bytes': None}
+    if resource is not None:
+        usage['max_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return usage
+
+def snapshot():
+    # Metrics of this process, to be merged into the parent's (see merge)
+    with _lock:
+        return {'stages': json.loads(json.dumps(_stages)), 'http': json.loads(json.dumps(_http)),
+                'memory': memory_usage()}
+
+def merge(other):
+    with _lock:
+        for stage, tables in other['stages'].items():
+            _merge_counters(_stages.setdefault(stage, {}), tables)
+        _merge_counters(_http, other['http'])
+        _worker_memory.append(other['memory'])
+
+def _merge_counters(target, source):
+    for key, value in source.items():
+        if isinstance(value, dict):
+            _merge_counters(target.setdefault(key, {}), value)
+        else:
+            target[key] = target.get(key, 0) + value
+
+
+def _with_rates(entry):
+    entry = dict(entry)
+    entry['seconds'] = round(entry['seconds'], 4)
+    entry['cpu_seconds'] = round(entry['cpu_seconds'], 4)
+    if entry.get('rows'):
+        entry['rows_per_s'] = round(entry['rows'] / entry['seconds'], 1) if entry['seconds'] else None
+    if 'by_categoria' in entry:
+        entry['by_categoria'] = {key: _with_rates(value) for key, value in entry['by_categoria'].items()}
+    return entry
+
+def report(**extra):
+    """Everything measured so far as a JSON-serializable dict; `extra` is added at the top level."""
+    finished_at = datetime.now()
+    with _lock:
+        stages = {stage: {table: _with_rates(entry) for table, entry in tables.items()}
+                  for stage, tables in _stages.items()}
+        http = json.loads(json.dumps(_http))
+        workers = list(_worker_memory)
+    for entry in http.values():
+        entry['seconds'] = round(entry['seconds'], 4)
+        entry['avg_ms'] = round(1000 * entry['seconds'] / entry['requests'], 1) if entry['requests'] else None
+    return {
+        'started_at': _started_at.isoformat(timespec='seconds') if _started_at else None,
+        'finished_at': finished_at.isoformat(timespec='seconds'),
+        'duration_s': round((finished_at - _started_at).total_seconds(), 3) if _started_at else None,
+        'stages': stages,
+        'http': http,
+        'memory': {**memory_usage(), 'workers': workers},
+        **extra,
+    }
+
+def write_report(path, **extra):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report(**extra), f, indent=2, ensure_ascii=False, default=str)
+    logger.info(f"📈 Métricas guardadas en: {path}")
+
+def write_profiles(prefix):
+    # One pstats file per stage (python -m pstats, snakeviz, flameprof...)
+    if not _profiles:
+        return []
+    paths = []
+    with _profile_lock:
+        for stage, profile in _profiles.items():
+            path = f"{prefix}.{stage}.prof"
+            profile.dump_stats(path)
+            paths.append(path)
+    for path in paths:
+        logger.info(f"🔬 Perfil guardado en: {path}")
+    return paths
+
+def log_file_prefix(logger):
+    # Path of the run's log file without its extension, so metrics and profiles are written next to it
+    handlers = list(logger.handlers)
+    for handler in logger.handlers:  # through the QueueHandler to the listener's file handler
+        listener = getattr(handler, "listener", None)
+        handlers.extend(listener.handlers if listener is not None else [])
+    for handler in handlers:
+        if isinstance(handler, logging.FileHandler):
+            return os.path.splitext(handler.baseFilename)[0]
+    return os.path.join(os.getcwd(), f"padel_etl_{datetime.now():%Y%m%d_%H%M%S}")
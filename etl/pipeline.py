@@ -0,0 +1,295 @@
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from .api_client import get_categorias, get_clubs, get_enfrentamientos, iter_resultados
+from .delta import filter_pending, build_state
+from .loaders import load_categorias, load_clubs, load_enfrentamientos, load_resultados, upsert_stats
+from . import metrics
+from .schema import concat_frames
+from .utils import (flush_cache, get_api_stats, get_replay_mode, merge_api_stats, set_replay_mode,
+                    use_shared_rate_limit)
+from .validation import KEY_COLUMNS, quarantine, validate
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (API_MAX_WORKERS, PIPELINE_BATCH_SIZE, PIPELINE_QUEUE_SIZE, RESULTADOS_CHUNK_SIZE, PROCESS_WORKERS,
+                    METRICS_TRACE_MEMORY, VALIDATION_ENABLED)
+from logger_config import Progress
+
+# Obtener el logger configurado
+logger = logging.getLogger('padel_etl')
+
+# Tables in foreign key order: a table is only written after everything buffered for its parents
+LOAD_ORDER = ["categorias", "clubs", "enfrentamientos", "resultados"]
+LOADERS = {
+    "categorias": load_categorias,
+    "clubs": load_clubs,
+    "enfrentamientos": load_enfrentamientos,
+    "resultados": load_resultados,
+}
+
+_DONE = object()
+_WORKER_DONE = "__worker_done__"
+
+# Set in each worker process by _init_worker
+_worker_items = None
+_worker_stop = None
+
+
+def with_resultado(enfrentamientos):
+    return enfrentamientos[
+        ~enfrentamientos['resultado'].str.replace(" ", "").str.lower().str.contains("sinresultado", na=False)
+    ]
+
+def extract_competition(id, id_base64, loaded_state, fetched_state,
+                        max_workers=API_MAX_WORKERS, chunk_size=RESULTADOS_CHUNK_SIZE):
+    """
+    Extract one competition, yielding (table, frame) pairs as soon as each piece is fetched.
+
+    Args:
+        id, id_base64: Competition ID, plain and base64 encoded
+        loaded_state: {enfrentamiento_api_id: resultado} already loaded (see etl.delta)
+        fetched_state: Dict updated with the enfrentamientos whose resultados were fetched
+        max_workers: Max resultados requests in flight
+        chunk_size: Enfrentamientos per yielded resultados frame
+
+    Yields:
+        (table, DataFrame) in foreign key order within each category
+    """
+    logger.info("📂 Obteniendo categorías...")
+    categorias = get_categorias(id_base64)
+    yield "categorias", categorias
+
+    # One aggregated progress line every LOG_PROGRESS_SECONDS instead of lines per category
+    progress = Progress(logger, f"Competición {id}")
+    try:
+        for categoria_api_id in categorias['categoria_api_id'].tolist():
+            logger.debug(f"   Procesando categoría: {categoria_api_id}")
+            yield "clubs", get_clubs(id, categoria_api_id)
+
+            enfrentamientos = get_enfrentamientos(id_base64, categoria_api_id)
+            yield "enfrentamientos", enfrentamientos
+
+            con_resultado = with_resultado(enfrentamientos)
+            pendientes = filter_pending(con_resultado, loaded_state)
+            logger.debug(f"   {len(con_resultado)} enfrentamientos con resultado, {len(pendientes)} nuevos o modificados")
+            progress.update(categorias=1, enfrentamientos=len(con_resultado), nuevos_o_modificados=len(pendientes))
+            for resultados in iter_resultados(pendientes['enfrentamiento_api_id'], chunk_size, max_workers, categoria_api_id):
+                fetched_state.update(build_state(pendientes, resultados))
+                progress.update(resultados=len(resultados))
+                yield "resultados", resultados
+    finally:
+        progress.flush()
+
+
+def _init_worker(items, stop, log_queue, log_level, rate_slot, replay):
+    # Worker processes send their frames to the parent through `items` and their log records
+    # through `log_queue`; they share the parent's rate limit slot and replay flag.
+    global _worker_items, _worker_stop
+    # If the parent stops consuming, pending frames are dropped instead of blocking the worker's exit
+    items.cancel_join_thread()
+    _worker_items = items
+    _worker_stop = stop
+    worker_logger = logging.getLogger('padel_etl')
+    worker_logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+    worker_logger.setLevel(log_level)
+    worker_logger.propagate = False
+    use_shared_rate_limit(rate_slot)
+    set_replay_mode(replay)
+    metrics.start(trace_memory=METRICS_TRACE_MEMORY)
+
+def _extract_worker(competition, loaded_state, max_workers):
+    id, id_base64, name = competition
+    logger.info(f"🏟️ Competición {name} ({id})")
+    fetched_state = {}
+    source = extract_competition(id, id_base64, loaded_state, fetched_state, max_workers=max_workers)
+    try:
+        for item in source:
+            while not _worker_stop.is_set():
+                try:
+                    _worker_items.put(item, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+            if _worker_stop.is_set():
+                break
+    finally:
+        source.close()
+        flush_cache()  # worker processes end without running atexit
+        if not _worker_stop.is_set():
+            _worker_items.put(_WORKER_DONE)
+    return fetched_state, get_api_stats(), metrics.snapshot()
+
+def extract_competitions(competitions, loaded_state, fetched_state, processes=PROCESS_WORKERS):
+    """
+    Extract several competitions, yielding the (table, frame) pairs of all of them.
+
+    With more than one competition and process, each competition is extracted in its own worker
+    process. The API_MAX_WORKERS request budget and the politeness delay are shared between the
+    workers, and their frames are funnelled back here so that a single loader writes everything.
+    """
+    if processes <= 1 or len(competitions) <= 1:
+        for id, id_base64, name in competitions:
+            logger.info(f"🏟️ Competición {name} ({id})")
+            yield from extract_competition(id, id_base64, loaded_state, fetched_state)
+        return
+
+    processes = min(processes, len(competitions))
+    max_workers = max(1, API_MAX_WORKERS // processes)
+    logger.info(f"⚙️ {len(competitions)} competiciones en {processes} procesos ({max_workers} peticiones por proceso)")
+
+    # spawn: the parent already runs threads (pipeline, HTTP pool), which fork does not handle safely
+    ctx = multiprocessing.get_context("spawn")
+    items = ctx.Queue(maxsize=PIPELINE_QUEUE_SIZE * processes)
+    stop = ctx.Event()
+    log_queue = ctx.Queue()
+    listener = logging.handlers.QueueListener(log_queue, *logger.handlers, respect_handler_level=True)
+    listener.start()
+    executor = ProcessPoolExecutor(
+        processes, mp_context=ctx, initializer=_init_worker,
+        initargs=(items, stop, log_queue, logger.level, ctx.Value('d', 0.0), get_replay_mode()))
+    try:
+        futures = [executor.submit(_extract_worker, competition, loaded_state, max_workers)
+                   for competition in competitions]
+        pending = len(futures)
+        while pending:
+            try:
+                item = items.get(timeout=1)
+            except queue.Empty:
+                failed = [f for f in futures if f.done() and f.exception() is not None]
+                if failed:
+                    raise failed[0].exception()
+                continue
+            if isinstance(item, str) and item == _WORKER_DONE:
+                pending -= 1
+                continue
+            yield item
+        for future in futures:
+            worker_state, worker_stats, worker_metrics = future.result()
+            fetched_state.update(worker_state)
+            merge_api_stats(worker_stats)
+            metrics.merge(worker_metrics)
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        listener.stop()
+
+
+class BatchLoader:
+    """
+    Buffers extracted frames per table and writes them every `batch_size` rows.
+
+    Before a table is written, the buffers of its parent tables (see LOAD_ORDER) are flushed,
+    so foreign keys always point at rows that are already in the DB.
+    """
+
+    def __init__(self, cursor, connection, batch_size=PIPELINE_BATCH_SIZE):
+        self.cursor = cursor
+        self.connection = connection
+        self.batch_size = batch_size
+        self.buffers = {table: [] for table in LOAD_ORDER}
+        self.buffered_rows = dict.fromkeys(LOAD_ORDER, 0)
+        self.rows = dict.fromkeys(LOAD_ORDER, 0)
+        self.stats = {table: upsert_stats([], 0) for table in LOAD_ORDER}
+        self.quarantined = dict.fromkeys(LOAD_ORDER, 0)
+        # Parent keys loaded by this run, so the foreign key checks only ask the DB about the others
+        self.known_keys = {"categorias": set(), "enfrentamientos": set()}
+
+    def add(self, table, frame):
+        if frame.empty:
+            return
+        self.buffers[table].append(frame)
+        self.buffered_rows[table] += len(frame)
+        self.rows[table] += len(frame)
+        if self.buffered_rows[table] >= self.batch_size:
+            self.flush(table)
+
+    def flush(self, table):
+        for parent in LOAD_ORDER[:LOAD_ORDER.index(table)]:
+            self._write(parent)
+        self._write(table)
+
+    def flush_all(self):
+        for table in LOAD_ORDER:
+            self._write(table)
+
+    def _write(self, table):
+        if not self.buffers[table]:
+            return
+        # One concat per batch (not per fetched frame) keeps the copying linear
+        frame = concat_frames(table, self.buffers[table])
+        self.buffers[table] = []
+        self.buffered_rows[table] = 0
+        options = {}
+        if VALIDATION_ENABLED:
+            # Offending rows go to the cuarentena table (committed with the load) instead of failing the batch
+            with metrics.timed("validate", table) as timer:
+                frame, rejected = validate(table, frame, self.cursor, self.known_keys)
+                timer.rows = len(frame) + len(rejected)
+            self.quarantined[table] += quarantine(self.cursor, table, rejected)
+            if table == "resultados":
+                # Their enfrentamientos are not marked as loaded, so the next run fetches them again
+                options["incomplete"] = rejected['enfrentamiento_api_id'].dropna().tolist()
+        else:
+            # The latest version wins, e.g. a resumed run re-extracting rows that were already checkpointed
+            frame = frame.drop_duplicates(KEY_COLUMNS[table], keep='last')
+        with metrics.timed("load", table) as timer:
+            stats = LOADERS[table](self.cursor, self.connection, frame, **options)
+            timer.rows = len(frame)
+        if table in self.known_keys:
+            self.known_keys[table].update(frame[KEY_COLUMNS[table][0]].tolist())
+        for key, value in stats.items():
+            self.stats[table][key] += value
+
+
+def run_pipeline(source, loader, queue_size=PIPELINE_QUEUE_SIZE):
+    """
+    Run the extraction generator in a background thread and load its frames as they arrive.
+
+    The bounded queue lets network extraction and DB writes overlap while keeping at most
+    `queue_size` frames in memory. Errors on either side stop both stages and are re-raised here.
+    """
+    items = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in source:
+                if not put(item):
+                    return
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            if hasattr(source, "close"):
+                source.close()
+            put(_DONE)
+
+    producer = threading.Thread(target=produce, name="extract", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                break
+            loader.add(*item)
+        if errors:
+            raise errors[0]
+        loader.flush_all()
+    finally:
+        stop.set()
+        producer.join(timeout=5)
@@ -0,0 +1,144 @@
+"""
+Change probe: decides whether a run has anything to do, with the standard library only.
+
+It fetches the competition list, the categories of the selected competitions and the enfrentamientos
+(GetResultadosEncuentros) of every category, and hashes those payloads. A fingerprint equal to the one
+stored by the last successful run means no result changed, so main.py exits before importing
+pandas/psycopg2. Keep this module (and what it imports) free of third-party packages.
+"""
+import base64
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from fnmatch import fnmatch
+
+from . import metrics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (API_BASE_URL, API_HEADERS, API_COOKIES, API_MAX_WORKERS, API_REQUEST_DELAY,
+                    API_CONNECT_TIMEOUT, API_READ_TIMEOUT, API_MAX_RETRIES, API_BACKOFF_BASE,
+                    API_BACKOFF_MAX, API_RETRY_STATUS)
+
+logger = logging.getLogger('padel_etl')
+
+
+class ProbeError(Exception):
+    """Raised when a probe request fails: the run cannot be skipped."""
+
+
+def select_competitions(rows, patterns):
+    # Competitions whose name (without spaces, lowercase) matches any pattern, as (id, id_base64, name).
+    # Patterns without wildcards match as substrings: "lliga14", "lliga*", "*".
+    patterns = [p if any(c in p for c in "*?[") else f"*{p}*" for p in (p.replace(" ", "").lower() for p in patterns)]
+    return [(id, base64.b64encode(str(id).encode()).decode(), name) for id, name in rows
+            if any(fnmatch(name.replace(" ", "").lower(), pattern) for pattern in patterns)]
+
+
+class _Fetcher:
+    # Plain urllib POSTs with the ETL's headers, retries and politeness delay
+    def __init__(self):
+        cookie = "; ".join(f"{name}={value}" for name, value in API_COOKIES.items())
+        self.headers = {**API_HEADERS, "Cookie": cookie}
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def _wait_for_slot(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + API_REQUEST_DELAY
+            self.requests += 1
+        if slot > now:
+            time.sleep(slot - now)
+
+    def post(self, endpoint, payload):
+        """The 'd' string of the response: hashed as is, never decoded into records."""
+        request = urllib.request.Request(API_BASE_URL + endpoint, data=json.dumps(payload).encode(),
+                                         headers=self.headers, method="POST")
+        for attempt in range(API_MAX_RETRIES + 1):
+            self._wait_for_slot()
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=API_CONNECT_TIMEOUT + API_READ_TIMEOUT) as response:
+                    body = response.read()
+                metrics.record_http(endpoint, time.perf_counter() - start, len(body), response.status)
+                try:
+                    return json.loads(body)['d']
+                except (ValueError, KeyError, TypeError) as e:
+                    raise ProbeError(f"Respuesta inesperada de {endpoint}: {e}") from e
+            except urllib.error.HTTPError as e:
+                metrics.record_http(endpoint, time.perf_counter() - start, 0, e.code)
+                if e.code not in API_RETRY_STATUS:
+                    raise ProbeError(f"Error HTTP {e.code} en {endpoint}") from e
+                error = f"Error HTTP {e.code}"
+            except OSError as e:  # URLError, timeouts, connection errors
+                metrics.record_http(endpoint, time.perf_counter() - start, 0)
+                error = f"Request error: {e}"
+            if attempt < API_MAX_RETRIES:
+                time.sleep(min(API_BACKOFF_MAX, API_BACKOFF_BASE * 2 ** attempt))
+        raise ProbeError(f"{error} en {endpoint} tras {API_MAX_RETRIES} reintentos")
+
+
+def _records(payload, endpoint, fields):
+    # `fields` of each record of a 'd' payload; a payload of another shape fails the probe like a failed request
+    try:
+        return [tuple(row[field] for field in fields) for row in json.loads(payload)]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ProbeError(f"Respuesta inesperada de {endpoint}: {e!r}") from e
+
+
+def probe(patterns, max_workers=API_MAX_WORKERS):
+    """
+    Fingerprint of the API payloads a run of `patterns` depends on.
+
+    Returns:
+        {'fingerprint': sha256 hex, 'competitions': n, 'categories': n, 'requests': n}
+    """
+    fetcher = _Fetcher()
+    digest = hashlib.sha256(json.dumps(sorted(patterns)).encode())
+    rows = _records(fetcher.post("GetListEntranscursoCompeticiones", {'v': '100'}), "GetListEntranscursoCompeticiones",
+                    ('idcompeticion', 'name'))
+    try:
+        competitions = select_competitions(rows, patterns)
+    except (AttributeError, TypeError) as e:  # a name that is not a string
+        raise ProbeError(f"Respuesta inesperada de GetListEntranscursoCompeticiones: {e!r}") from e
+
+    with ThreadPoolExecutor(max(1, max_workers)) as executor:
+        categories = executor.map(lambda c: fetcher.post("Get_Cats_Competi", {'v': c[1]}), competitions)
+        requests = []
+        for (id, id_base64, name), payload in zip(competitions, categories):
+            digest.update(f"{id}\0{payload}\0".encode())
+            for (idcategoria,) in _records(payload, "Get_Cats_Competi", ('idcategoria',)):
+                requests.append({'v': id_base64, 'cat': idcategoria, 'ty': '7', 'tab': '2', 'ace': '0',
+                                 'jornada': '0', 'lugar': '0'})
+        # Same payload as get_enfrentamientos: its resultado strings change whenever a result is published
+        for payload, response in zip(requests, executor.map(lambda p: fetcher.post("GetResultadosEncuentros", p), requests)):
+            digest.update(f"{payload['v']}\0{payload['cat']}\0{response}\0".encode())
+
+    return {'fingerprint': digest.hexdigest(), 'competitions': len(competitions), 'categories': len(requests),
+            'requests': fetcher.requests}
+
+def read_fingerprint(path):
+    # Fingerprint stored by the last successful run, None if there is none (or it cannot be read)
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f).get('fingerprint')
+    except (OSError, ValueError):
+        return None
+
+def write_fingerprint(path, result):
+    # Temporary file first, like the delta state file: an interrupted run never leaves it truncated
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({**result, 'saved_at': datetime.now().isoformat(timespec='seconds')}, f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,240 @@
+import heapq
+import logging
+import os
+import signal
+import sys
+import threading
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+
+from .api_client import get_categorias, get_competitions, get_enfrentamientos, iter_resultados
+from .changes import new_run_id, publish_changes
+from .delta import filter_pending, get_loaded_state
+from .pipeline import BatchLoader, extract_competitions, run_pipeline, with_resultado
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (API_MAX_WORKERS, RESULTADOS_CHUNK_SIZE, SCHEDULER_TIMEZONE, SCHEDULER_FIRST_POLL,
+                    SCHEDULER_BACKOFF_MIN, SCHEDULER_BACKOFF_MAX, SCHEDULER_MAX_AGE, SCHEDULER_SWEEP_INTERVAL,
+                    SCHEDULER_ERROR_RETRY, CHANGES_ENABLED)
+
+# Obtener el logger configurado
+logger = logging.getLogger('padel_etl')
+
+# Enfrentamientos already loaded that are still waiting for their resultados
+WAITING_SQL = """
+SELECT e.enfrentamiento_api_id, e.categoria_api_id, e.fecha_partido
+FROM enfrentamientos e
+WHERE e.fecha_partido IS NOT NULL
+  AND e.fecha_partido > %s
+  AND NOT EXISTS (
+      SELECT 1 FROM resultados r
+      WHERE r.enfrentamiento_api_id = e.enfrentamiento_api_id
+  );
+"""
+
+
+def local_now():
+    # fecha_partido is stored as the API's local time, without time zone
+    return datetime.now(ZoneInfo(SCHEDULER_TIMEZONE)).replace(tzinfo=None)
+
+def next_poll_time(fecha_partido, now):
+    """
+    When to look for the resultado of a match again.
+
+    The first poll is SCHEDULER_FIRST_POLL after the scheduled start. After that the wait is half of
+    the time the resultado has been overdue, within [SCHEDULER_BACKOFF_MIN, SCHEDULER_BACKOFF_MAX]:
+    a geometric backoff that only depends on the clock, so it survives restarts.
+    """
+    expected = fecha_partido + SCHEDULER_FIRST_POLL
+    if now < expected:
+        return expected
+    return now + min(max((now - expected) / 2, SCHEDULER_BACKOFF_MIN), SCHEDULER_BACKOFF_MAX)
+
+
+class MatchScheduler:
+    """
+    Priority queue (heapq) of the enfrentamientos expected to get a resultado, ordered by next poll time.
+
+    Entries are never removed from the heap in place: rescheduling pushes a new entry and stale ones
+    (whose time no longer matches `self.matches`) are skipped when popped.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.matches = {}  # enfrentamiento_api_id -> (categoria_api_id, fecha_partido, poll_at)
+
+    def __len__(self):
+        return len(self.matches)
+
+    def schedule(self, enfrentamiento_id, categoria_api_id, fecha_partido, now):
+        if fecha_partido < now - SCHEDULER_MAX_AGE:
+            self.matches.pop(enfrentamiento_id, None)  # too old: left to the full sweeps
+            return
+        poll_at = next_poll_time(fecha_partido, now)
+        self.matches[enfrentamiento_id] = (categoria_api_id, fecha_partido, poll_at)
+        heapq.heappush(self.heap, (poll_at, enfrentamiento_id))
+
+    def discard(self, enfrentamiento_id):
+        self.matches.pop(enfrentamiento_id, None)
+
+    def retry(self, enfrentamiento_ids, now):
+        # Back off matches whose poll failed, as if they were still without resultado
+        for enfrentamiento_id in enfrentamiento_ids:
+            if enfrentamiento_id in self.matches:
+                categoria_api_id, fecha_partido, _ = self.matches[enfrentamiento_id]
+                self.schedule(enfrentamiento_id, categoria_api_id, fecha_partido, now)
+
+    def rebuild(self, rows, now):
+        # rows: (enfrentamiento_api_id, categoria_api_id, fecha_partido) of the matches without resultados
+        self.heap = []
+        self.matches = {}
+        for enfrentamiento_id, categoria_api_id, fecha_partido in rows:
+            self.schedule(enfrentamiento_id, categoria_api_id, fecha_partido, now)
+
+    def next_time(self):
+        while self.heap:
+            poll_at, enfrentamiento_id = self.heap[0]
+            if self.matches.get(enfrentamiento_id, (None, None, None))[2] == poll_at:
+                return poll_at
+            heapq.heappop(self.heap)  # stale entry
+        return None
+
+    def due(self, now):
+        # {categoria_api_id: [enfrentamiento_api_id, ...]} of the matches whose poll time has come
+        due = {}
+        while (poll_at := self.next_time()) is not None and poll_at <= now:
+            _, enfrentamiento_id = heapq.heappop(self.heap)
+            due.setdefault(self.matches[enfrentamiento_id][0], []).append(enfrentamiento_id)
+        return due
+
+    def update(self, enfrentamientos, with_resultados, due_ids, now):
+        """
+        Apply a category poll: drop matches that got their resultado, follow rescheduled ones
+        (fecha_partido changed) and back off the polled ones still without resultado.
+        """
+        for enfrentamiento_id, categoria_api_id, fecha_partido in zip(
+                enfrentamientos['enfrentamiento_api_id'].tolist(), enfrentamientos['categoria_api_id'].tolist(),
+                enfrentamientos['fecha_partido'].tolist()):
+            if enfrentamiento_id in with_resultados:
+                self.discard(enfrentamiento_id)
+            elif pd.notna(fecha_partido) and (enfrentamiento_id in due_ids or enfrentamiento_id in self.matches):
+                current = self.matches.get(enfrentamiento_id)
+                if enfrentamiento_id in due_ids or current[1] != fecha_partido:
+                    self.schedule(enfrentamiento_id, categoria_api_id, fecha_partido.to_pydatetime(), now)
+        for enfrentamiento_id in due_ids:
+            # No longer listed by the API
+            if enfrentamiento_id in self.matches and self.matches[enfrentamiento_id][2] <= now:
+                self.discard(enfrentamiento_id)
+
+
+def sweep(patterns, conn, processes):
+    """Full run over all the competitions, like a normal ETL run. Returns {categoria_api_id: (id, id_base64)}."""
+    competitions = get_competitions(patterns)
+    if not competitions:
+        raise Exception(f"Ninguna competición en curso coincide con {patterns}")
+    logger.info(f"🧹 Barrido completo de {len(competitions)} competiciones")
+    with conn.cursor() as cur:
+        loaded_state = get_loaded_state(cur)
+        loader = BatchLoader(cur, conn)
+        run_pipeline(extract_competitions(competitions, loaded_state, {}, processes), loader)
+    conn.commit()
+    competition_by_categoria = {}
+    for id, id_base64, name in competitions:
+        for categoria_api_id in get_categorias(id_base64)['categoria_api_id'].tolist():
+            competition_by_categoria[categoria_api_id] = (id, id_base64)
+    return competition_by_categoria
+
+def poll_categoria(conn, competition, categoria_api_id):
+    """
+    Fetch the enfrentamientos of one category and the resultados that appeared since the last load.
+    Returns the enfrentamientos frame and the set of enfrentamiento ids that have a resultado.
+    """
+    id, id_base64 = competition
+    enfrentamientos = get_enfrentamientos(id_base64, categoria_api_id)
+    con_resultado = with_resultado(enfrentamientos)
+    with conn.cursor() as cur:
+        pendientes = filter_pending(con_resultado, get_loaded_state(cur))
+        loader = BatchLoader(cur, conn)
+        loader.add("enfrentamientos", enfrentamientos)
+        for resultados in iter_resultados(pendientes['enfrentamiento_api_id'], RESULTADOS_CHUNK_SIZE,
+                                          API_MAX_WORKERS, categoria_api_id):
+            loader.add("resultados", resultados)
+        loader.flush_all()
+    conn.commit()
+    logger.info(f"   Categoría {categoria_api_id}: {len(pendientes)} enfrentamientos con resultado nuevo")
+    return enfrentamientos, set(con_resultado['enfrentamiento_api_id'].tolist())
+
+
+def run_daemon(patterns, connect, processes, stop=None):
+    """
+    Long-running mode: instead of full runs at fixed times, poll only the categories with matches
+    expected to have a new resultado (see MatchScheduler) and run a full sweep every
+    SCHEDULER_SWEEP_INTERVAL. Each cycle that sweeps or polls tags its change events with a run_id of its
+    own and publishes them once loaded. Stops on SIGINT/SIGTERM or when `stop` is set.
+    """
+    stop = stop or threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+
+    scheduler = MatchScheduler()
+    competition_by_categoria = {}
+    next_sweep = local_now()
+    logger.info(f"🕒 Modo daemon: barrido completo cada {SCHEDULER_SWEEP_INTERVAL.total_seconds() / 3600:g} h, "
+                f"primera consulta {SCHEDULER_FIRST_POLL.total_seconds() / 60:g} min después de cada partido")
+
+    while not stop.is_set():
+        retry_at = None
+        conn = connect()
+        try:
+            if conn is None:
+                raise Exception("Error de conexión a Supabase")
+            now = local_now()
+            polled = False
+            new_run_id()
+            if now >= next_sweep:
+                polled = True
+                competition_by_categoria = sweep(patterns, conn, processes)
+                now = local_now()
+                next_sweep = now + SCHEDULER_SWEEP_INTERVAL
+                with conn.cursor() as cur:
+                    cur.execute(WAITING_SQL, (now - SCHEDULER_MAX_AGE,))
+                    scheduler.rebuild(cur.fetchall(), now)
+                logger.info(f"📅 {len(scheduler)} partidos a la espera de resultado")
+
+            for categoria_api_id, due_ids in scheduler.due(now).items():
+                if stop.is_set():
+                    break
+                competition = competition_by_categoria.get(categoria_api_id)
+                if competition is None:
+                    for enfrentamiento_id in due_ids:
+                        scheduler.discard(enfrentamiento_id)  # category no longer in a current competition
+                    continue
+                try:
+                    enfrentamientos, with_resultados = poll_categoria(conn, competition, categoria_api_id)
+                except Exception as e:
+                    conn.rollback()
+                    logger.error(f"❌ Error consultando la categoría {categoria_api_id}: {e}")
+                    scheduler.retry(due_ids, local_now())
+                    continue
+                scheduler.update(enfrentamientos, with_resultados, set(due_ids), local_now())
+                polled = True
+            if polled and CHANGES_ENABLED:
+                publish_changes(conn)
+        except Exception as e:
+            logger.error(f"❌ Error en el daemon: {e}")
+            logger.exception("Detalles del error:")
+            retry_at = local_now() + SCHEDULER_ERROR_RETRY
+        finally:
+            if conn is not None:
+                conn.close()
+
+        wake_at = min(t for t in (scheduler.next_time(), next_sweep, retry_at) if t is not None)
+        wait = max((wake_at - local_now()).total_seconds(), 1)
+        if wait > 60:
+            logger.info(f"💤 Próxima consulta a las {wake_at:%Y-%m-%d %H:%M} ({len(scheduler)} partidos pendientes)")
+        stop.wait(wait)
+
+    logger.info("🛑 Daemon detenido")
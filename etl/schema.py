@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+from .transforms import to_int
+
+# Declared dtypes of the frames handed from extraction to the loaders: nullable integers sized to their
+# values (scores fit in Int8, ids in Int32 like their INTEGER columns), categoricals for the strings that
+# repeat across rows and datetime64 for dates. Applied at the end of each transform (apply_schema).
+SCHEMAS = {
+    "categorias": {
+        "categoria_api_id": "Int32",
+        "nombre": "category",
+        "genero": "category",
+        "fecha": "datetime64[s]",
+        "row_hash": "int64",
+    },
+    "clubs": {
+        "nombre": "category",
+        "categoria_api_id": "Int32",
+        "fecha": "datetime64[s]",
+        "row_hash": "int64",
+    },
+    "enfrentamientos": {
+        "fecha_partido": "datetime64[s]",
+        "resultado": "category",
+        "club_local_id": "category",
+        "club_visitante_id": "category",
+        "jornada": "Int16",
+        "enfrentamiento_api_id": "Int32",
+        "fecha": "datetime64[s]",
+        "categoria_api_id": "Int32",
+        "row_hash": "int64",
+    },
+    "resultados": {
+        "partido_api_id": "Int32",
+        "is_local_ganador": "bool",
+        "nombre1_local": "category",
+        "nombre2_local": "category",
+        "nombre1_visitante": "category",
+        "nombre2_visitante": "category",
+        "set1_local": "Int8",
+        "set1_visitante": "Int8",
+        "set2_local": "Int8",
+        "set2_visitante": "Int8",
+        "set3_local": "Int8",
+        "set3_visitante": "Int8",
+        "pista": "Int16",
+        "puntos": "Int16",
+        "fecha": "datetime64[s]",
+        "enfrentamiento_api_id": "Int32",
+        "row_hash": "int64",
+    },
+}
+
+
+def _out_of_range(values, dtype):
+    # Mask of the values that do not fit the nullable integer `dtype` (astype would wrap them around)
+    info = np.iinfo(dtype.lower())
+    return ((values < info.min) | (values > info.max)).to_numpy(dtype=bool, na_value=False)
+
+def out_of_range(table, frame):
+    """{column: mask} of the integer columns of `frame` holding values that do not fit their declared dtype."""
+    return {column: _out_of_range(frame[column], dtype) for column, dtype in SCHEMAS[table].items()
+            if dtype.startswith("Int") and column in frame.columns and frame[column].dtype != dtype
+            and pd.api.types.is_integer_dtype(frame[column])}
+
+def _cast(series, dtype):
+    if dtype.startswith("Int"):
+        values = to_int(series)  # also numeric strings and integral floats
+        # A column with values that do not fit stays Int64: validation rejects those rows as fuera de rango
+        return values if _out_of_range(values, dtype).any() else values.astype(dtype)
+    if dtype.startswith("datetime64"):
+        return pd.to_datetime(series).astype(dtype)  # also datetime.date
+    return series.astype(dtype)
+
+def apply_schema(table, frame):
+    """Cast the columns of `frame` to the declared dtypes of `table`; columns already of that dtype are kept."""
+    casts = {column: _cast(frame[column], dtype) for column, dtype in SCHEMAS[table].items()
+             if column in frame.columns and frame[column].dtype != dtype}
+    return frame.assign(**casts) if casts else frame
+
+def _union_categories(columns):
+    # Empty and all-missing columns have no categories (and object-dtype ones): they add nothing
+    categories = [column.cat.categories for column in columns if len(column.cat.categories)]
+    return categories[0].append(categories[1:]).unique() if categories else pd.Index([])
+
+def concat_frames(table, frames):
+    """
+    pd.concat keeping the declared dtypes. Every fetched frame has its own categories, and pd.concat
+    turns categoricals with different categories into object columns: they are unified first.
+    """
+    frames = list(frames)
+    if len(frames) > 1:
+        categoricals = [column for column, dtype in SCHEMAS[table].items()
+                        if dtype == "category" and all(column in frame.columns for frame in frames)]
+        dtypes = {column: pd.CategoricalDtype(_union_categories([frame[column] for frame in frames]))
+                  for column in categoricals}
+        if dtypes:
+            frames = [frame.astype(dtypes) for frame in frames]
+    return pd.concat(frames, ignore_index=True)
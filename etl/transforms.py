@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+# Vectorized equivalents of the per-cell helpers the transforms used to .apply() (clean_string,
+# extract_id_partido, convert_to_int, convert_to_datetime; kept in benchmarks/bench_transforms.py). Each one works on a whole column at once and returns the
+# same values as the .apply() version (apply infers the dtype of its output, hence the infer_objects
+# calls; to_int returns a nullable Int64 column instead, whatever the mix of values).
+
+HTML_TEXT_PATTERN = r'>\s*([^<]+)\s*<'
+ID_PARTIDO_PATTERN = r"this,'(\d+)'"
+# The ASCII strings int() accepts: a decimal integer literal between whitespace ('4.0' and '' are not).
+# Spelled out instead of \d and \s, which pyarrow's regex engine reads as ASCII only and Python's does not
+INT_LITERAL_PATTERN = r'^[\t\n\x0b\x0c\r ]*[+-]?[0-9]+(?:_[0-9]+)*[\t\n\x0b\x0c\r ]*$'
+ASCII_PATTERN = r'^[\x00-\x7f]*$'
+
+
+def clean_strings(series):
+    # Text between the first pair of HTML tags, stripped; values without tags are returned unchanged
+    text = series.str.extract(HTML_TEXT_PATTERN, expand=False).str.strip()
+    return series.where(text.isna(), text).infer_objects()
+
+def extract_ids_partido(series):
+    # ID inside verpartidos(this,'<id>'); missing when there is no match
+    return series.str.extract(ID_PARTIDO_PATTERN, expand=False).infer_objects()
+
+def _truncated(numbers):
+    # int() of numbers: floats truncated toward zero; NaN, infinities and values past int64 missing
+    if numbers.dtype.kind == 'f':
+        numbers = np.trunc(numbers.where(numbers.abs() < 2 ** 63))
+    return numbers.astype('Int64')
+
+def _parsed(literals):
+    # int() of ASCII integer literals
+    literals = literals.str.strip()
+    if literals.str.contains('_', regex=False).any():
+        literals = literals.str.replace('_', '', regex=False)
+    try:
+        return literals.astype('int64')
+    except (ValueError, OverflowError):
+        return _one_by_one(literals)
+
+def _one_by_one(values):
+    # int() of each value, missing where it raises or the result does not fit in int64
+    numbers = []
+    for value in values.tolist():
+        try:
+            number = int(value)
+        except (ValueError, TypeError):
+            number = None
+        numbers.append(number if number is not None and -2 ** 63 <= number < 2 ** 63 else None)
+    return pd.Series(numbers, index=values.index, dtype='Int64')
+
+def to_int(series):
+    """
+    convert_to_int over a whole column: int(value) where it succeeds and missing where it raises, as
+    a nullable Int64 column. Strings must be integer literals (' 6 ' is 6, '4.0' and '' are missing),
+    numbers are truncated like int() does (3.5 is 3).
+    """
+    if series.dtype.kind in 'iub':
+        return series.astype('Int64')
+    if series.dtype.kind == 'f':
+        return _truncated(series.astype('float64'))
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(object)
+    values = np.zeros(len(series), dtype=np.int64)
+    missing = np.ones(len(series), dtype=bool)
+    literal = series.str.match(INT_LITERAL_PATTERN)  # missing for the values that are not strings
+    text = literal.notna().to_numpy()
+    literal = literal.eq(True).to_numpy(dtype=bool, na_value=False)
+    if literal.any():
+        numbers = _parsed(series[literal])
+        values[literal] = numbers.fillna(0).to_numpy(dtype=np.int64)
+        missing[literal] = numbers.isna().to_numpy()
+    # Other strings with non-ASCII characters may still be literals (int('٣') is 3), int() decides
+    unicode = text & ~literal
+    if unicode.any():
+        unicode[unicode] = series[unicode].str.match(ASCII_PATTERN).eq(False).to_numpy(dtype=bool, na_value=False)
+        if unicode.any():
+            numbers = _one_by_one(series[unicode])
+            values[unicode] = numbers.fillna(0).to_numpy(dtype=np.int64)
+            missing[unicode] = numbers.isna().to_numpy()
+    # Numbers and bools in an object column
+    others = ~text & series.notna().to_numpy()
+    if others.any():
+        numbers = _truncated(pd.to_numeric(series[others].astype(object), errors='coerce'))
+        values[others] = numbers.fillna(0).to_numpy(dtype=np.int64)
+        missing[others] = numbers.isna().to_numpy()
+    return pd.Series(pd.arrays.IntegerArray(values, missing), index=series.index, name=series.name)
+
+def to_datetime(series, format='%d/%m/%Y %H:%M'):
+    # One columnar parse; unparseable dates become NaT
+    return pd.to_datetime(series, format=format, errors='coerce')
+
+def to_flag(series, true_value=1):
+    return pd.to_numeric(series, errors='coerce') == true_value
@@ -1,67 +1,283 @@
 import requests
+import numpy as np
 import pandas as pd
-import re
 import json
+import atexit
 import base64
 import os
 import sys
+import time
+import random
 import logging
+import threading
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import API_BASE_URL, API_HEADERS, API_COOKIES
+from config import (API_BASE_URL, API_HEADERS, API_COOKIES, API_MAX_WORKERS, API_REQUEST_DELAY,
+                    API_CONNECT_TIMEOUT, API_READ_TIMEOUT, API_MAX_RETRIES, API_BACKOFF_BASE,
+                    API_BACKOFF_MAX, API_RETRY_STATUS, API_JSON_DECODER, CACHE_ENABLED, CACHE_DIR,
+                    CACHE_MAX_BYTES, CACHE_TTLS, CACHE_DEFAULT_TTL)
+from .cache import ResponseCache
+from . import metrics
+
+try:
+    import orjson  # optional: several times faster than json on the large response strings
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger('padel_etl')
 
+# Next free request slot per host, shared by all fetching threads. Worker processes share a single
+# slot (a multiprocessing.Value) instead, so the politeness delay holds across the whole run.
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+_shared_slot = None
+
+# Shared HTTP session and per-endpoint request counters
+_session = None
+_session_lock = threading.Lock()
+_api_stats = {}
+_stats_lock = threading.Lock()
+
+# On-disk response cache; in replay mode every response must come from it
+_cache = None
+_cache_lock = threading.Lock()
+_replay_mode = False
+
+
+class APIError(Exception):
+    """Raised when an API request fails and cannot be retried (or runs out of retries)."""
+
 
 def convert_to_base64(value): 
     return base64.b64encode(str(value).encode()).decode()
 
-def convert_to_dataframe(data):
-    return pd.DataFrame(json.loads(data['d']))
-
-def clean_string(string):    
-    match = re.search(r'>\s*([^<]+)\s*<', string)
-    if match:
-        return match.group(1).strip()
-    return string
-
-def extract_id_partido(verpartidos):
-    match = re.search(r"this,'(\d+)'", verpartidos)
-    return match.group(1) if match else None
-
-def convert_to_datetime(date_string, format='%d/%m/%Y %H:%M'):
-    try:
-        return pd.to_datetime(date_string, format=format)
-    except ValueError:
-        return pd.NaT
-    
-def convert_to_int(value):
-    try:
-        return int(value)
-    except (ValueError, TypeError):
-        return None
+def json_loads(content):
+    # str or bytes; orjson when installed, json otherwise (both raise a ValueError subclass)
+    return orjson.loads(content) if orjson is not None else json.loads(content)
+
+def _pruned_record(fields):
+    # json object_pairs_hook: each record is reduced to the values of `fields` while it is decoded
+    def hook(pairs):
+        record = dict(pairs)
+        return tuple(record.get(field) for field in fields)
+    return hook
+
+def convert_to_dataframe(data, columns=None):
+    """
+    DataFrame of the records in the API's {'d': <json string>} envelope.
+
+    With `columns` (a list of API fields, or {field: column} to rename them) only those columns are
+    built, instead of a full-width object frame of every field the API returns that callers then
+    select from. By default json drops the other fields while decoding, so the full records are never
+    held in memory; API_JSON_DECODER=orjson decodes up to ~1.8x faster at a higher peak (every full
+    record at once). Fields missing from a record are None.
+    """
+    if columns is None:
+        return pd.DataFrame(json_loads(data['d']))
+    if not isinstance(columns, dict):
+        columns = dict(zip(columns, columns))
+    fields = list(columns)
+    if API_JSON_DECODER == "orjson" and orjson is not None:
+        records = orjson.loads(data['d'])
+        values = [[record.get(field) for record in records] for field in fields]
+    else:
+        records = json.loads(data['d'], object_pairs_hook=_pruned_record(fields))
+        values = [list(column) for column in zip(*records)] or [[] for _ in fields]
+    return pd.DataFrame(dict(zip(columns.values(), values)))
+
+def _hash_values(series):
+    # Object values of a column, with integral floats as ints: an integer column is float64 as soon as one
+    # of its values is missing, and str(3.0) is '3.0' where str(3) and str(Int8 3) are '3'
+    values = series.astype(object)
+    if series.dtype.kind == 'f':
+        numbers = series.to_numpy(dtype='float64', na_value=np.nan)
+        integral = np.isfinite(numbers) & (numbers % 1 == 0)
+        if integral.any():
+            values = values.to_numpy(copy=True)
+            values[integral] = numbers[integral].astype(np.int64).tolist()
+            values = pd.Series(values, index=series.index)
+    return values
+
+def compute_row_hash(df, columns):
+    # Content hash per row (signed 64 bits, stored as BIGINT). Values are normalised to strings first
+    # so the hash does not depend on the dtype pandas happened to infer (3 vs 3.0 vs Int8 3 vs '3').
+    content = pd.DataFrame({col: _hash_values(df[col]) for col in columns}, index=df.index)
+    content = content.where(content.notna(), None).astype(str)
+    return pd.util.hash_pandas_object(content, index=False).to_numpy().view('int64')
+
+def use_shared_rate_limit(slot):
+    global _shared_slot
+    _shared_slot = slot
+
+def wait_for_host_slot(url, delay=API_REQUEST_DELAY):
+    # Politeness delay: requests to the same host are spaced at least `delay` seconds apart
+    if delay <= 0:
+        return
+    if _shared_slot is not None:
+        with _shared_slot.get_lock():
+            now = time.time()
+            slot = max(now, _shared_slot.value)
+            _shared_slot.value = slot + delay
+        if slot > now:
+            time.sleep(slot - now)
+        return
+    host = urlparse(url).netloc
+    with _host_slots_lock:
+        now = time.monotonic()
+        slot = max(now, _host_slots.get(host, now))
+        _host_slots[host] = slot + delay
+    if slot > now:
+        time.sleep(slot - now)
+
+def get_session():
+    # Shared keep-alive session: one connection pool per host, sized for the extraction threads
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(API_MAX_WORKERS, 1), max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(API_HEADERS)
+            session.cookies.update(API_COOKIES)
+            _session = session
+        return _session
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None and (CACHE_ENABLED or _replay_mode):
+            _cache = ResponseCache(CACHE_DIR, CACHE_MAX_BYTES)
+        return _cache
+
+def flush_cache():
+    # Commit the cache index writes still buffered (end of a run or of a worker process)
+    with _cache_lock:
+        if _cache is not None:
+            _cache.flush()
+
+atexit.register(flush_cache)
+
+def set_replay_mode(enabled):
+    # Serve the whole run from cached responses, whatever their age; a cache miss is an error
+    global _replay_mode
+    _replay_mode = enabled
+
+def get_replay_mode():
+    return _replay_mode
+
+def _backoff_delay(attempt, retry_after=None):
+    # Exponential backoff with full jitter; a Retry-After header (in seconds) wins if present
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), API_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(API_BACKOFF_MAX, API_BACKOFF_BASE * 2 ** attempt))
+
+def _endpoint_stats(endpoint):
+    return _api_stats.setdefault(endpoint, {'requests': 0, 'retries': 0, 'errors': 0, 'cache_hits': 0,
+                                            'total_time': 0.0, 'max_time': 0.0})
+
+def _record_cache_hit(endpoint):
+    with _stats_lock:
+        _endpoint_stats(endpoint)['cache_hits'] += 1
+
+def _record_request(endpoint, elapsed, retried=False, failed=False):
+    with _stats_lock:
+        stats = _endpoint_stats(endpoint)
+        stats['requests'] += 1
+        stats['retries'] += int(retried)
+        stats['errors'] += int(failed)
+        stats['total_time'] += elapsed
+        stats['max_time'] = max(stats['max_time'], elapsed)
+
+def get_api_stats():
+    # Per-endpoint counters: requests, retries, errors, cache hits and latency (seconds)
+    with _stats_lock:
+        return {endpoint: dict(stats) for endpoint, stats in _api_stats.items()}
+
+def merge_api_stats(stats_by_endpoint):
+    # Add counters collected elsewhere (e.g. in a worker process) to this process' counters
+    with _stats_lock:
+        for endpoint, stats in stats_by_endpoint.items():
+            current = _endpoint_stats(endpoint)
+            for key, value in stats.items():
+                current[key] = max(current[key], value) if key == 'max_time' else current[key] + value
+
+def log_api_stats():
+    for endpoint, stats in sorted(get_api_stats().items()):
+        avg_ms = 1000 * stats['total_time'] / stats['requests'] if stats['requests'] else 0
+        logger.info(f"   {endpoint}: {stats['requests']} peticiones, {stats['cache_hits']} desde caché, "
+                    f"{stats['retries']} reintentos, {stats['errors']} errores, "
+                    f"media {avg_ms:.0f} ms, máx {1000 * stats['max_time']:.0f} ms")
 
 def get_data(endpoint, payload):
     url = API_BASE_URL + endpoint
-    
-    logger.debug(f"API Request: {endpoint} | Payload: {payload}")
-    
-    try:
-        response = requests.post(url, headers=API_HEADERS, cookies=API_COOKIES, json=payload)
-        
-        logger.debug(f"API Response: {response.status_code} | Content-Type: {response.headers.get('content-type', 'N/A')}")
-        
-        if response.status_code == 200:
-            return response.json()
+    cache = get_cache()
+    # Checked once: the f-strings below would otherwise be built on every request even at INFO
+    debug = logger.isEnabledFor(logging.DEBUG)
+
+    if cache is not None:
+        max_age = None if _replay_mode else CACHE_TTLS.get(endpoint, CACHE_DEFAULT_TTL)
+        if max_age is None or max_age > 0:
+            data = cache.get(endpoint, payload, max_age)
+            if data is not None:
+                if debug:
+                    logger.debug(f"API Cache: {endpoint} | Payload: {payload}")
+                _record_cache_hit(endpoint)
+                return data
+        if _replay_mode:
+            raise APIError(f"Sin respuesta en caché para {endpoint} {payload} (modo replay)")
+
+    session = get_session()
+    if debug:
+        logger.debug(f"API Request: {endpoint} | Payload: {payload}")
+
+    for attempt in range(API_MAX_RETRIES + 1):
+        last_attempt = attempt == API_MAX_RETRIES
+        retry_after = None
+        wait_for_host_slot(url)
+        start = time.perf_counter()
+        try:
+            response = session.post(url, json=payload, timeout=(API_CONNECT_TIMEOUT, API_READ_TIMEOUT))
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            elapsed = time.perf_counter() - start
+            _record_request(endpoint, elapsed, retried=not last_attempt, failed=last_attempt)
+            metrics.record_http(endpoint, elapsed, 0)
+            error = f"Request error: {e}"
         else:
-            logger.error(f"Error HTTP {response.status_code} en {endpoint}")
-            logger.debug(f"Response: {response.text[:500]}")
-            return None
-            
-    except requests.exceptions.JSONDecodeError as e:
-        logger.error(f"JSON decode error: {e}")
-        logger.debug(f"Response text: {response.text[:500]}")
-        return None
-    except Exception as e:
-        logger.error(f"Request error: {e}")
-        return None
\ No newline at end of file
+            elapsed = time.perf_counter() - start
+            metrics.record_http(endpoint, elapsed, len(response.content), response.status_code)
+            if debug:
+                logger.debug(f"API Response: {response.status_code} | Content-Type: {response.headers.get('content-type', 'N/A')} | {elapsed * 1000:.0f} ms")
+
+            if response.status_code == 200:
+                _record_request(endpoint, elapsed)
+                try:
+                    data = json_loads(response.content)
+                except ValueError as e:
+                    logger.debug(f"Response text: {response.text[:500]}")
+                    raise APIError(f"JSON decode error en {endpoint}: {e}") from e
+                if cache is not None:
+                    cache.put(endpoint, payload, data)
+                return data
+
+            if response.status_code not in API_RETRY_STATUS:
+                _record_request(endpoint, elapsed, failed=True)
+                logger.debug(f"Response: {response.text[:500]}")
+                raise APIError(f"Error HTTP {response.status_code} en {endpoint}")
+
+            _record_request(endpoint, elapsed, retried=not last_attempt, failed=last_attempt)
+            retry_after = response.headers.get('Retry-After')
+            error = f"Error HTTP {response.status_code}"
+
+        if last_attempt:
+            break
+        delay = _backoff_delay(attempt, retry_after)
+        logger.warning(f"{error} en {endpoint}, reintento {attempt + 1}/{API_MAX_RETRIES} en {delay:.1f}s")
+        time.sleep(delay)
+
+    raise APIError(f"{error} en {endpoint} tras {API_MAX_RETRIES} reintentos")
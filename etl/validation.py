@@ -0,0 +1,143 @@
+import json
+import logging
+
+import numpy as np
+import pandas as pd
+from psycopg2.extras import execute_values
+
+from .schema import out_of_range
+
+# Obtener el logger configurado
+logger = logging.getLogger('padel_etl')
+
+# Conflict key of each table: a batch must not hold the same key twice (ON CONFLICT would reject it)
+KEY_COLUMNS = {
+    "categorias": ["categoria_api_id"],
+    "clubs": ["nombre", "categoria_api_id"],
+    "enfrentamientos": ["enfrentamiento_api_id"],
+    "resultados": ["partido_api_id"],
+}
+# Columns that cannot be NULL: the keys, plus the foreign key that places the row
+REQUIRED_COLUMNS = {
+    "categorias": ["categoria_api_id"],
+    "clubs": ["nombre", "categoria_api_id"],
+    "enfrentamientos": ["enfrentamiento_api_id", "categoria_api_id"],
+    "resultados": ["partido_api_id", "enfrentamiento_api_id"],
+}
+# Foreign keys: column -> parent table, whose key is its single KEY_COLUMNS column
+FOREIGN_KEYS = {
+    "clubs": {"categoria_api_id": "categorias"},
+    "enfrentamientos": {"categoria_api_id": "categorias"},
+    "resultados": {"enfrentamiento_api_id": "enfrentamientos"},
+}
+SETS = [("set1_local", "set1_visitante"), ("set2_local", "set2_visitante"), ("set3_local", "set3_visitante")]
+
+QUARANTINE_SQL = """
+INSERT INTO cuarentena (tabla, clave, motivo, fila) VALUES %s
+ON CONFLICT (tabla, clave, motivo) DO UPDATE
+SET fila = EXCLUDED.fila, veces = cuarentena.veces + 1, ultima_vez = now();
+"""
+
+
+def _existing_keys(cursor, table, keys):
+    # Keys of `table` among `keys` that are already in the DB
+    column = KEY_COLUMNS[table][0]
+    cursor.execute(f"SELECT {column} FROM {table} WHERE {column} = ANY(%s);", ([int(key) for key in keys],))
+    return {row[0] for row in cursor.fetchall()}
+
+def _score_mismatch(frame):
+    # Sets won by each pair, over the sets with both scores; the winner flag must agree when they differ
+    local = visitante = np.zeros(len(frame), dtype=np.int64)
+    negative = np.zeros(len(frame), dtype=bool)
+    for local_col, visitante_col in SETS:
+        if local_col not in frame.columns or visitante_col not in frame.columns:
+            continue
+        home = pd.to_numeric(frame[local_col], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        away = pd.to_numeric(frame[visitante_col], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        local = local + (home > away)
+        visitante = visitante + (away > home)
+        negative |= (home < 0) | (away < 0)
+    ganador = frame['is_local_ganador'].to_numpy(dtype=bool, na_value=False)
+    decided = local != visitante
+    return decided & (ganador != (local > visitante)), negative
+
+def validate(table, frame, cursor=None, known_keys=None):
+    """
+    Split a batch about to be loaded into the rows that can be loaded and the offending ones.
+
+    Checks, all vectorized: required columns not NULL, integers that fit their declared dtype (see
+    etl.schema), one row per key (the last version wins, earlier ones that differ are rejected), foreign
+    keys present in `known_keys` (parent keys loaded by this run) or in the DB through `cursor`, and for
+    resultados the sets against is_local_ganador.
+
+    Returns:
+        (valid frame, rejected frame with a 'motivo' column)
+    """
+    reasons = []  # (mask, motivo)
+
+    for column in REQUIRED_COLUMNS[table]:
+        if column in frame.columns:
+            reasons.append((frame[column].isna().to_numpy(), f"{column} nulo"))
+
+    for column, mask in out_of_range(table, frame).items():
+        reasons.append((mask, f"{column} fuera de rango"))
+
+    keys = KEY_COLUMNS[table]
+    # Rows with a NULL key are already rejected above, not duplicates of each other
+    duplicated = frame.duplicated(keys, keep='last').to_numpy() & frame[keys].notna().all(axis=1).to_numpy()
+    if duplicated.any():
+        # Identical repeats (e.g. a resumed run re-extracting a row) are just dropped
+        repeated = duplicated & frame.duplicated(keys + ['row_hash'], keep='last').to_numpy() if 'row_hash' in frame.columns else duplicated
+        reasons.append((duplicated & ~repeated, "clave duplicada en el lote con otro contenido"))
+    else:
+        repeated = duplicated
+
+    for column, parent in FOREIGN_KEYS.get(table, {}).items():
+        values = frame[column]
+        parent_keys = set(known_keys.get(parent, ())) if known_keys is not None else set()
+        missing = values.notna().to_numpy() & ~values.isin(parent_keys).to_numpy()
+        if missing.any() and cursor is not None:
+            found = _existing_keys(cursor, parent, values[missing].unique())
+            if known_keys is not None:
+                known_keys.setdefault(parent, set()).update(found)
+            missing &= ~values.isin(found).to_numpy()
+        if cursor is not None or known_keys is not None:
+            reasons.append((missing, f"{column} sin {parent}"))
+
+    if table == "resultados" and 'is_local_ganador' in frame.columns:
+        mismatch, negative = _score_mismatch(frame)
+        reasons.append((mismatch, "sets incoherentes con is_local_ganador"))
+        reasons.append((negative, "juegos negativos"))
+
+    rejected = np.zeros(len(frame), dtype=bool)
+    for mask, _ in reasons:
+        rejected |= mask
+    valid = frame[~rejected & ~repeated]
+    if not rejected.any():
+        return valid, frame.iloc[:0].assign(motivo=pd.Series(dtype=object))
+    # Reasons are only joined for the rejected rows
+    motivos = [[] for _ in range(int(rejected.sum()))]
+    positions = np.flatnonzero(rejected)
+    for mask, motivo in reasons:
+        for i in np.flatnonzero(mask[positions]):
+            motivos[i].append(motivo)
+    return valid, frame.iloc[positions].assign(motivo=["; ".join(m) for m in motivos])
+
+def quarantine(cursor, table, rejected):
+    """
+    Store rejected rows in the cuarentena table, with their reasons and the row as JSON. A row
+    rejected again (same table, key and reasons) only updates its counter and last time seen.
+    """
+    if rejected.empty:
+        return 0
+    keys = KEY_COLUMNS[table]
+    claves = ["|".join("" if pd.isna(value) else str(value) for value in values)
+              for values in zip(*(rejected[column].tolist() for column in keys))]
+    filas = json.loads(rejected.drop(columns='motivo').to_json(orient='records', date_format='iso'))
+    rows = {(clave, motivo): json.dumps(fila, ensure_ascii=False)
+            for clave, motivo, fila in zip(claves, rejected['motivo'].tolist(), filas)}
+    execute_values(cursor, QUARANTINE_SQL, [(table, clave, motivo, fila) for (clave, motivo), fila in rows.items()],
+                   template="(%s, %s, %s, %s::jsonb)")
+    logger.warning(f"⚠️ {len(rejected)} filas de {table} en cuarentena: "
+                   + ", ".join(f"{n} {motivo}" for motivo, n in rejected['motivo'].value_counts().items()))
+    return len(rejected)
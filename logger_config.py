@@ -1,63 +1,260 @@
+import atexit
+import glob
+import gzip
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
 from datetime import datetime
 
+from config import (LOG_FORMAT, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_RETENTION_DAYS, LOG_MAX_TOTAL_BYTES,
+                    LOG_PROGRESS_INTERVAL)
+
+# Writes the records queued by the logger's QueueHandler to the file and console handlers
+_listener = None
+# logs/padel_etl_<timestamp>.pid of this process while it runs: prune_logs leaves that run's files alone
+_pid_file = None
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record (LOG_FORMAT=json), for log shippers and jq."""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "process": record.processName,
+            "thread": record.threadName,
+            "func": record.funcName,
+            "line": record.lineno,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class Progress:
+    """
+    Aggregated progress of per-item work (categories, batches...): `update` only adds to the counters,
+    and one summary line is logged at most every `interval` seconds, plus a last one on `flush`.
+    """
+
+    def __init__(self, logger, label, interval=LOG_PROGRESS_INTERVAL):
+        self.logger = logger
+        self.label = label
+        self.interval = interval
+        self.counts = {}
+        self.pending = False
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def update(self, **counts):
+        with self.lock:
+            for key, value in counts.items():
+                self.counts[key] = self.counts.get(key, 0) + value
+            self.pending = True
+            if time.monotonic() - self.last < self.interval:
+                return
+        self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return
+            line = ", ".join(f"{value} {key.replace('_', ' ')}" for key, value in self.counts.items())
+            self.pending = False
+            self.last = time.monotonic()
+        self.logger.info(f"⏳ {self.label}: {line}")
+
+
+def _gzip_rotator(source, dest):
+    # RotatingFileHandler rotator: the rotated file is compressed (runs on the listener thread)
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+def _process_alive(pid):
+    if os.name == 'nt':
+        return True  # os.kill would terminate it: runs are assumed alive
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _live_runs(logs_dir):
+    # File prefixes ('.../padel_etl_<timestamp>') of the runs whose process is alive, e.g. a --daemon
+    # sleeping between polls; pid files left by runs that died are removed
+    live = set()
+    for path in glob.glob(os.path.join(logs_dir, 'padel_etl_*.pid')):
+        try:
+            with open(path, encoding='utf-8') as f:
+                pid = int(f.read().strip())
+        except (OSError, ValueError):
+            continue
+        if _process_alive(pid):
+            live.add(path[:-len('.pid')])
+        else:
+            os.remove(path)
+    return live
+
+def _tracked_files(logs_dir):
+    # Files of logs/ committed to git (example logs shipped with the repo); none without git
+    try:
+        result = subprocess.run(['git', 'ls-files', '-z', '--', '.'], cwd=logs_dir, capture_output=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return set()
+    if result.returncode != 0:
+        return set()
+    return {os.path.join(logs_dir, name) for name in result.stdout.decode().split('\0') if name}
+
+def prune_logs(logs_dir, keep=(), idle_seconds=3600):
+    """
+    Bound the disk used by logs/: logs of earlier runs are gzipped once nobody has written to them for
+    `idle_seconds`, files older than LOG_RETENTION_DAYS are deleted, and then the oldest ones until the
+    directory is under LOG_MAX_TOTAL_MB. Files in `keep` (the current run's), those of runs still alive
+    (see _live_runs) and those tracked by git are never touched.
+    """
+    now = time.time()
+    live = _live_runs(logs_dir)
+    protected = set(keep) | _tracked_files(logs_dir)
+
+    def untouchable(path):
+        return path in protected or path.endswith('.pid') or any(path.startswith(prefix + '.') for prefix in live)
+
+    for path in glob.glob(os.path.join(logs_dir, 'padel_etl_*.log')):
+        if not untouchable(path) and now - os.path.getmtime(path) > idle_seconds:
+            _gzip_rotator(path, path + '.gz')
+
+    files = []
+    for path in glob.glob(os.path.join(logs_dir, 'padel_etl_*')):
+        if untouchable(path):
+            continue
+        stat = os.stat(path)
+        if now - stat.st_mtime > LOG_RETENTION_DAYS * 86400:
+            os.remove(path)
+        else:
+            files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= LOG_MAX_TOTAL_BYTES:
+            break
+        os.remove(path)
+        total -= size
+
+def _write_pid_file(path):
+    global _pid_file
+    _remove_pid_file()
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(str(os.getpid()))
+    _pid_file = path
+
+def _remove_pid_file():
+    global _pid_file
+    if _pid_file is not None:
+        try:
+            os.remove(_pid_file)
+        except OSError:
+            pass
+        _pid_file = None
+
+def stop_logger():
+    # Flush and stop the listener thread; registered with atexit, so sys.exit() loses no record
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 def setup_logger(log_level=logging.INFO):
     """
     Configure the logging system for the Padel ETL process.
-    
+
+    The logger only puts records on a queue: formatting, disk and console I/O happen on a
+    QueueListener thread, so logging never blocks the fetching threads.
+
     Args:
         log_level: Logging level (DEBUG, INFO, WARNING, ERROR)
 
     Returns:
         logger: Configured logger instance
     """
-    
+    global _listener
+
     # Crear directorio 'logs' si no existe
     logs_dir = os.path.join(os.path.dirname(__file__), 'logs')
     if not os.path.exists(logs_dir):
         os.makedirs(logs_dir)
-    
+
     # Name of the log file with timestamp
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     log_filename = f'padel_etl_{timestamp}.log'
     log_filepath = os.path.join(logs_dir, log_filename)
-    
+    try:
+        _write_pid_file(os.path.splitext(log_filepath)[0] + '.pid')
+        prune_logs(logs_dir, keep={log_filepath})
+    except OSError as e:
+        sys.stderr.write(f"⚠️ No se pudieron limpiar los logs antiguos: {e}\n")  # the handlers are not set up yet
+
     # Personalization of the logging format
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s'
-    )
-    
-    # File Handler for detailed logs
-    file_handler = logging.FileHandler(log_filepath, encoding='utf-8')
+    if LOG_FORMAT == 'json':
+        formatter = JsonLinesFormatter()
+    else:
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s'
+        )
+
+    # File Handler for detailed logs, rotated (and gzipped) past LOG_MAX_MB
+    file_handler = logging.handlers.RotatingFileHandler(log_filepath, maxBytes=LOG_MAX_BYTES,
+                                                        backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    file_handler.namer = lambda name: name + '.gz'
+    file_handler.rotator = _gzip_rotator
     file_handler.setLevel(log_level)
     file_handler.setFormatter(formatter)
-    
+
     # Console Handler for summary logs
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
     console_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
     console_handler.setFormatter(console_formatter)
-    
+
     # Primary Logger Configuration
     logger = logging.getLogger('padel_etl')
     logger.setLevel(log_level)
-    
+
     # Clear existing handlers
+    stop_logger()
     logger.handlers.clear()
-    
-    # Add handlers
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
+
+    # Add handlers: the logger only enqueues, the listener thread writes
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    queue_handler.listener = _listener  # like dictConfig does; see etl.metrics.log_file_prefix
+    _listener.start()
+    logger.addHandler(queue_handler)
+
     # Avoid log propagation to root logger
     logger.propagate = False
-    
+
     # Initial log messages
     logger.info("=" * 50)
     logger.info("INICIO DEL PROCESO ETL PADEL VALLES")
     logger.info("=" * 50)
     logger.info(f"Log guardado en: {log_filepath}")
     logger.info(f"Nivel de logging: {logging.getLevelName(log_level)}")
-    
-    return logger
\ No newline at end of file
+
+    return logger
+
+
+atexit.register(stop_logger)
+atexit.register(_remove_pid_file)
@@ -1,14 +1,20 @@
-import psycopg2
-import pandas as pd
+import argparse
 import logging
+import os
 import sys
-from config import USER, PASSWORD, HOST, PORT, DBNAME
-from etl.api_client import get_competition_id,get_categorias, get_clubs, get_enfrentamientos, get_resultados
-from etl.loaders import load_categorias, load_clubs, load_enfrentamientos, load_resultados
+from config import (USER, PASSWORD, HOST, PORT, DBNAME, DELTA_ENABLED, DELTA_STATE_FILE, COMPETITIONS, PROCESS_WORKERS,
+                    METRICS_TRACE_MEMORY, CHECKPOINT_ENABLED, CHECKPOINT_DIR, PROBE_STATE_FILE, PROBE_UNCHANGED_EXIT_CODE,
+                    BACKFILL_WORKERS, CHANGES_ENABLED)
+from etl import metrics
+from etl.probe import ProbeError, probe, read_fingerprint, write_fingerprint
 from logger_config import setup_logger
 
+# pandas, psycopg2 and requests (etl.api_client, etl.pipeline...) are imported where they are first
+# needed, so that a --probe run with nothing to do stays fast and works without them installed
+
 
 def conect_to_supabase():
+    import psycopg2
     logger = logging.getLogger('padel_etl')
     try:
         conn = psycopg2.connect(user=USER, password=PASSWORD, host=HOST, port=PORT, dbname=DBNAME)
@@ -19,113 +25,263 @@ def conect_to_supabase():
         return None  # ✅ Retornar None en lugar de sys.exit aquí
 
 
+def read_delta_state(conn):
+    # Enfrentamientos already loaded with their resultado; the local state file is the fallback
+    from etl.delta import get_loaded_state, read_state_file
+    logger = logging.getLogger('padel_etl')
+    try:
+        with conn.cursor() as cur:
+            return get_loaded_state(cur)
+    except Exception as e:
+        conn.rollback()
+        logger.warning(f"⚠️ No se pudo leer el estado incremental de la BD ({e}), usando {DELTA_STATE_FILE}")
+        return read_state_file(DELTA_STATE_FILE)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="ETL Pádel Vallès")
+    parser.add_argument("--replay", action="store_true",
+                        help="Servir todas las peticiones a la API desde la caché local (sin red)")
+    parser.add_argument("--competitions", nargs="+", default=COMPETITIONS,
+                        help="Patrones de nombre de las competiciones en curso, p.ej. lliga14 'lliga*' '*'")
+    parser.add_argument("--processes", type=int, default=PROCESS_WORKERS,
+                        help="Procesos de extracción en paralelo cuando hay varias competiciones")
+    parser.add_argument("--profile", action="store_true",
+                        help="Guardar un perfil cProfile por etapa junto al log (serializa las etapas: más lento)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Cargar los datos del checkpoint de la última ejecución fallida sin repetir la extracción")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Proceso continuo: consulta solo los partidos que esperan resultado y hace barridos completos de vez en cuando")
+    parser.add_argument("--backfill", nargs="+", metavar="ID",
+                        help="Cargar temporadas pasadas: ids de competición o rangos (p.ej. 250-318), reanudable")
+    parser.add_argument("--backfill-workers", type=int, default=BACKFILL_WORKERS,
+                        help="Categorías descargadas a la vez durante el backfill")
+    parser.add_argument("--rebuild-aggregates", action="store_true",
+                        help="Recalcular la clasificación y las estadísticas de jugadores desde todos los resultados")
+    parser.add_argument("--probe", action="store_true",
+                        help=f"Terminar sin extraer (código {PROBE_UNCHANGED_EXIT_CODE}) si los resultados no han cambiado desde la última ejecución correcta")
+    parser.add_argument("--probe-only", action="store_true",
+                        help=f"Solo la sonda: código 0 si hay cambios, {PROBE_UNCHANGED_EXIT_CODE} si no (no necesita pandas ni psycopg2)")
+    return parser.parse_args()
+
+
+def check_for_changes(competitions):
+    # (probe result, changed); on a probe error the run goes ahead, it cannot be skipped safely
+    logger = logging.getLogger('padel_etl')
+    logger.info("🔎 Sonda de cambios...")
+    try:
+        with metrics.timed("extract", "probe") as timer:
+            result = probe(competitions)
+            timer.rows = result['categories']
+    except ProbeError as e:
+        logger.warning(f"⚠️ Sonda fallida ({e}), se ejecuta el ETL completo")
+        return None, True
+    except Exception as e:
+        # Whatever else goes wrong in the probe, the run is not skipped (nor failed) because of it
+        logger.warning(f"⚠️ Error inesperado en la sonda ({e!r}), se ejecuta el ETL completo")
+        logger.debug("Detalles del error:", exc_info=True)
+        return None, True
+    changed = result['fingerprint'] != read_fingerprint(PROBE_STATE_FILE)
+    logger.info(f"   {result['competitions']} competiciones, {result['categories']} categorías, "
+                f"{result['requests']} peticiones: {'hay cambios' if changed else 'sin cambios'}")
+    return result, changed
+
+
+def log_summary(loader):
+    # Rows extracted, loaded and quarantined per table, and API requests; returns them for the metrics report
+    from etl.loaders import format_stats
+    from etl.utils import log_api_stats
+    logger = logging.getLogger('padel_etl')
+    logger.info("📊 RESUMEN:")
+    for table, rows in loader.rows.items():
+        quarantined = f", {loader.quarantined[table]} en cuarentena" if loader.quarantined[table] else ""
+        logger.info(f"   {table}: {rows} extraídos ({format_stats(loader.stats[table])}{quarantined})")
+    logger.info("🌐 Peticiones a la API:")
+    log_api_stats()
+    return {'rows': loader.rows, 'upserts': loader.stats, 'quarantined': loader.quarantined}
+
+
+def api_stats():
+    # etl.utils (requests, pandas) is only imported by runs that got past the probe
+    utils = sys.modules.get("etl.utils")
+    return utils.get_api_stats() if utils is not None else {}
+
+
 def main():
+    args = parse_args()
     logger = setup_logger(logging.INFO)
     success = False  # ✅ Flag para controlar el exit code
+    unchanged = False
+    metrics.start(trace_memory=METRICS_TRACE_MEMORY, profile=args.profile)
+    summary = {}
+    probe_result = None
 
     try:
-        # =======================================================
-        # STEP 1: EXTRACT FROM API AND TRANSFORM DATA
-        # =======================================================
-        logger.info("🔄 Iniciando extracción de datos de la API...")
-
-        #1. Get current competition ID
-        logger.info("Obteniendo ID de competición...")
-        id, id_base64 = get_competition_id("lliga14")
-        logger.info(f"ID: {id}, ID_BASE64: {id_base64}")
-
-        #TEST - TO REMOVE
-        #id = 308
-        #id_base64 = 'MzA4'
-
-        #2. Get categories
-        logger.info("📂 Obteniendo categorías...")
-        df_categorias = get_categorias(id_base64)
-        
-        #3. Get clubs and enfrentamientos for all categories
-        logger.info("🏃‍♂️ Obteniendo clubs y enfrentamientos...")
-        df_clubs = pd.DataFrame()
-        df_enfrentamientos = pd.DataFrame()
-        
-        for index, row in df_categorias.iterrows():
-            selected_category = row['categoria_api_id']
-            logger.info(f"   Procesando categoría: {selected_category}")
-
-            # Get clubs of the category
-            clubs_data = get_clubs(id, selected_category)
-            df_clubs = pd.concat([df_clubs, clubs_data], ignore_index=True)
-            
-            # Get enfrentamientos of the category
-            enfrentamientos_data = get_enfrentamientos(id_base64, selected_category)
-            df_enfrentamientos = pd.concat([df_enfrentamientos, enfrentamientos_data], ignore_index=True)
-
-        #4. Get resultados for enfrentamientos with results
-        logger.info("🏆 Obteniendo resultados...")
-        enfrentamientos_con_resultado = df_enfrentamientos[
-            ~df_enfrentamientos['resultado'].str.replace(" ", "").str.lower().str.contains("sinresultado", na=False)
-        ]
-        
-        df_resultados = pd.DataFrame()
-        for index, row in enfrentamientos_con_resultado.iterrows():
-            logger.info(f"   Obteniendo resultados para enfrentamiento: {row['enfrentamiento_api_id']}")
-            resultados_data = get_resultados(row['enfrentamiento_api_id'])
-            df_resultados = pd.concat([df_resultados, resultados_data], ignore_index=True)
-
-        # Resumen de datos extraídos
-        logger.info("📊 RESUMEN DE DATOS EXTRAÍDOS:")
-        logger.info(f"   Categorías: {len(df_categorias)}")
-        logger.info(f"   Clubs: {len(df_clubs)}")
-        logger.info(f"   Enfrentamientos: {len(df_enfrentamientos)}")
-        logger.info(f"   Resultados: {len(df_resultados)}")
+        if args.rebuild_aggregates:
+            from etl.aggregates import rebuild_aggregates
+            conn = conect_to_supabase()
+            if not conn:
+                raise Exception("Error de conexión a Supabase")
+            try:
+                with conn.cursor() as cur:
+                    summary['aggregates'] = rebuild_aggregates(cur)
+                conn.commit()
+            finally:
+                conn.close()
+            success = True
+            return
+
+        # --resume, --replay, --daemon and --backfill have their own sources of work: the probe does not apply
+        if (args.probe or args.probe_only) and not (args.resume or args.replay or args.daemon or args.backfill):
+            probe_result, changed = check_for_changes(args.competitions)
+            if probe_result is not None:
+                summary['probe'] = probe_result
+            if not changed:
+                logger.info(f"⏭️ Sin cambios desde la última ejecución correcta ({PROBE_STATE_FILE})")
+                unchanged = success = True
+                return
+            if args.probe_only:
+                success = True
+                return
+
+        from etl.api_client import get_competitions
+        from etl.checkpoint import Checkpoint, checkpoints_available, extraction_source
+        from etl.delta import read_state_file, write_state_file
+        from etl.pipeline import BatchLoader, extract_competitions, run_pipeline
+        from etl.changes import publish_changes, set_run_id
+        from etl.utils import set_replay_mode
+
+        # Change events are tagged with the run, named like its log file
+        set_run_id(os.path.basename(metrics.log_file_prefix(logger)).replace("padel_etl_", "", 1))
+
+        if args.replay:
+            set_replay_mode(True)
+            logger.info("▶️ Modo replay: respuestas servidas desde la caché")
+
+        if args.daemon:
+            from etl.scheduler import run_daemon
+            run_daemon(args.competitions, conect_to_supabase, args.processes)
+            success = True
+            return
+
+        if args.backfill:
+            from etl.backfill import run_backfill
+            conn = conect_to_supabase()
+            if not conn:
+                raise Exception("Error de conexión a Supabase")
+            try:
+                loader = run_backfill(args.backfill, conn, args.backfill_workers)
+                summary.update(log_summary(loader))
+                if CHANGES_ENABLED:
+                    summary['changes'] = publish_changes(conn)
+            finally:
+                conn.close()
+            success = True
+            return
+
+        use_checkpoints = CHECKPOINT_ENABLED and checkpoints_available()
+        if CHECKPOINT_ENABLED and not use_checkpoints:
+            logger.warning("⚠️ pyarrow no está instalado: checkpoints desactivados")
+        checkpoint = Checkpoint.open(CHECKPOINT_DIR) if args.resume and use_checkpoints else None
+        if args.resume and checkpoint is None:
+            logger.warning("⚠️ No hay checkpoint que reanudar, se extraerá todo de nuevo")
+
+        #1. Get current competitions
+        if checkpoint is not None:
+            competitions = checkpoint.competitions
+            state = "extracción completa" if checkpoint.complete else "extracción incompleta"
+            logger.info(f"⏯️ Reanudando el checkpoint del {checkpoint.manifest['created_at']} ({state})")
+        else:
+            logger.info("Obteniendo competiciones...")
+            competitions = get_competitions(args.competitions)
+            if not competitions:
+                raise Exception(f"Ninguna competición en curso coincide con {args.competitions}")
+            if use_checkpoints:
+                checkpoint = Checkpoint.create(CHECKPOINT_DIR, competitions)
+        for id, id_base64, name in competitions:
+            logger.info(f"   {name} - ID: {id}, ID_BASE64: {id_base64}")
+
+        # Profiles are per process: with --profile everything is extracted here
+        processes = 1 if args.profile else args.processes
+        fetched_state = {}
+
+        def extraction(loaded_state):
+            if checkpoint is None:
+                return extract_competitions(competitions, loaded_state, fetched_state, processes)
+            return extraction_source(checkpoint, competitions, loaded_state, fetched_state, processes)
 
         # =======================================================
-        # STEP 2: DATA LOAD TO SUPABASE
+        # EXTRACT, TRANSFORM AND LOAD (STREAMING)
         # =======================================================
-        logger.info("\n💾 Iniciando carga de datos a Supabase...")
-        
+        # Each category's frames are loaded while the next ones are being fetched;
+        # all competitions share this single loader and connection
         conn = conect_to_supabase()
         if not conn:
+            if checkpoint is not None and not checkpoint.complete:
+                # Extract anyway: the next run (--resume) will only have to load
+                logger.info(f"💾 Extrayendo los datos al checkpoint {CHECKPOINT_DIR}...")
+                for _ in extraction(read_state_file(DELTA_STATE_FILE) if DELTA_ENABLED else {}):
+                    pass
+                logger.info("💾 Checkpoint completo: reintentar la carga con --resume")
             logger.error("❌ No se pudo conectar a Supabase. Terminando proceso.")
             raise Exception("Error de conexión a Supabase")  # ✅ Usar raise en lugar de sys.exit
 
         try:
-            with conn.cursor() as cur:
-                # Cargar datos en orden de dependencias
-                logger.info("📂 Cargando categorías...")
-                load_categorias(cur, conn, df_categorias)
-
-                logger.info("🏃‍♂️ Cargando clubs...")
-                load_clubs(cur, conn, df_clubs)
+            loaded_state = read_delta_state(conn) if DELTA_ENABLED else {}
 
-                logger.info("🤝 Cargando enfrentamientos...")
-                load_enfrentamientos(cur, conn, df_enfrentamientos)
-
-                logger.info("🏆 Cargando resultados...")
-                load_resultados(cur, conn, df_resultados)
+            logger.info("🔄 Iniciando extracción y carga de datos...")
+            with conn.cursor() as cur:
+                loader = BatchLoader(cur, conn)
+                run_pipeline(extraction(loaded_state), loader)
 
             # Commit final
             conn.commit()
             logger.info("✅ Todos los datos cargados exitosamente")
+
+            # Resumen de datos extraídos y cargados
+            summary.update(log_summary(loader))
+            if CHANGES_ENABLED:
+                summary['changes'] = publish_changes(conn)
+
+            if DELTA_ENABLED:
+                # What the DB now holds as loaded, i.e. without the resultados that did not make it in
+                write_state_file(DELTA_STATE_FILE, read_delta_state(conn))
+            if probe_result is not None:
+                write_fingerprint(PROBE_STATE_FILE, probe_result)
+            if checkpoint is not None:
+                checkpoint.remove()
             success = True  # ✅ Marcar como exitoso
-            
+
         except Exception as e:
             conn.rollback()
             logger.error(f"❌ Error durante la carga: {e}")
+            if checkpoint is not None:
+                logger.info(f"💾 Datos extraídos guardados en {CHECKPOINT_DIR}: reintentar con --resume")
             raise  # ✅ Re-lanzar la excepción
         finally:
             conn.close()
             logger.info("🔐 Conexión cerrada")
 
         logger.info("✅ Proceso ETL completado exitosamente")
-        
+
     except Exception as e:
         logger.error(f"❌ Error crítico en el proceso ETL: {e}")
         logger.exception("Detalles del error:")
         success = False  # ✅ Marcar como fallido
-    
+
     finally:
+        prefix = metrics.log_file_prefix(logger)
+        try:
+            metrics.write_report(f"{prefix}.metrics.json", success=success, api=api_stats(), **summary)
+            metrics.write_profiles(prefix)
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudieron guardar las métricas: {e}")
         logger.info("=" * 50)
-        if success:
+        if unchanged:
+            logger.info("FIN DEL PROCESO ETL - SIN CAMBIOS")
+            logger.info("=" * 50)
+            sys.exit(PROBE_UNCHANGED_EXIT_CODE)
+        elif success:
             logger.info("FIN DEL PROCESO ETL - ÉXITO")
             logger.info("=" * 50)
             sys.exit(0)  # ✅ Exit exitoso
@@ -136,4 +292,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,231 @@
+-- Padel ETL schema. Idempotent: safe to run on an existing database.
+
+CREATE TABLE IF NOT EXISTS categorias (
+    categoria_api_id INTEGER PRIMARY KEY,
+    nombre VARCHAR(100),
+    genero VARCHAR(20),
+    fecha DATE
+);
+
+CREATE TABLE IF NOT EXISTS clubs (
+    id SERIAL PRIMARY KEY,
+    nombre VARCHAR(100),
+    categoria_api_id INTEGER REFERENCES categorias(categoria_api_id),
+    fecha DATE,
+    UNIQUE (nombre, categoria_api_id)
+);
+
+CREATE TABLE IF NOT EXISTS enfrentamientos (
+    enfrentamiento_api_id INTEGER PRIMARY KEY,
+    fecha_partido TIMESTAMP,
+    resultado VARCHAR(50),
+    club_local_id VARCHAR(100),
+    club_visitante_id VARCHAR(100),
+    jornada INTEGER,
+    fecha DATE,
+    categoria_api_id INTEGER REFERENCES categorias(categoria_api_id)
+);
+
+-- Players, interned by name: resultados reference them by id instead of repeating the names
+CREATE TABLE IF NOT EXISTS jugadores (
+    id SERIAL PRIMARY KEY,
+    nombre VARCHAR(100) NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS resultados (
+    partido_api_id INTEGER PRIMARY KEY,
+    enfrentamiento_api_id INTEGER REFERENCES enfrentamientos(enfrentamiento_api_id),
+    is_local_ganador BOOLEAN,
+    jugador1_local_id INTEGER REFERENCES jugadores(id),
+    jugador2_local_id INTEGER REFERENCES jugadores(id),
+    jugador1_visitante_id INTEGER REFERENCES jugadores(id),
+    jugador2_visitante_id INTEGER REFERENCES jugadores(id),
+    set1_local INTEGER,
+    set1_visitante INTEGER,
+    set2_local INTEGER,
+    set2_visitante INTEGER,
+    set3_local INTEGER,
+    set3_visitante INTEGER,
+    pista VARCHAR(20),
+    puntos INTEGER,
+    fecha DATE
+);
+
+-- Content hash per row: the loaders skip rows whose hash did not change
+ALTER TABLE categorias ADD COLUMN IF NOT EXISTS row_hash BIGINT;
+ALTER TABLE clubs ADD COLUMN IF NOT EXISTS row_hash BIGINT;
+ALTER TABLE enfrentamientos ADD COLUMN IF NOT EXISTS row_hash BIGINT;
+ALTER TABLE resultados ADD COLUMN IF NOT EXISTS row_hash BIGINT;
+
+-- Incremental extraction state (etl/delta.py): the resultado string an enfrentamiento had when its resultados
+-- were loaded, written in the same transaction as them. Databases created before the column start from the
+-- enfrentamientos that already have resultados.
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_schema = current_schema() AND table_name = 'enfrentamientos' AND column_name = 'resultado_cargado') THEN
+        ALTER TABLE enfrentamientos ADD COLUMN resultado_cargado VARCHAR(50);
+        UPDATE enfrentamientos e SET resultado_cargado = e.resultado
+        WHERE EXISTS (SELECT 1 FROM resultados r WHERE r.enfrentamiento_api_id = e.enfrentamiento_api_id);
+    END IF;
+END $$;
+
+-- Player ids instead of names. Databases created with the name columns are migrated: the names
+-- already loaded are interned into jugadores, then the columns are dropped (a VACUUM FULL resultados
+-- afterwards gives the space back). row_hash still covers the names, so no row is rewritten by the ETL.
+ALTER TABLE resultados ADD COLUMN IF NOT EXISTS jugador1_local_id INTEGER REFERENCES jugadores(id);
+ALTER TABLE resultados ADD COLUMN IF NOT EXISTS jugador2_local_id INTEGER REFERENCES jugadores(id);
+ALTER TABLE resultados ADD COLUMN IF NOT EXISTS jugador1_visitante_id INTEGER REFERENCES jugadores(id);
+ALTER TABLE resultados ADD COLUMN IF NOT EXISTS jugador2_visitante_id INTEGER REFERENCES jugadores(id);
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema = current_schema() AND table_name = 'resultados' AND column_name = 'nombre1_local') THEN
+        INSERT INTO jugadores (nombre)
+        SELECT DISTINCT btrim(v.nombre)
+        FROM resultados r,
+             LATERAL (VALUES (r.nombre1_local), (r.nombre2_local), (r.nombre1_visitante), (r.nombre2_visitante)) AS v(nombre)
+        WHERE btrim(v.nombre) <> ''
+        ON CONFLICT (nombre) DO NOTHING;
+
+        UPDATE resultados r SET
+            jugador1_local_id = (SELECT id FROM jugadores j WHERE j.nombre = btrim(r.nombre1_local)),
+            jugador2_local_id = (SELECT id FROM jugadores j WHERE j.nombre = btrim(r.nombre2_local)),
+            jugador1_visitante_id = (SELECT id FROM jugadores j WHERE j.nombre = btrim(r.nombre1_visitante)),
+            jugador2_visitante_id = (SELECT id FROM jugadores j WHERE j.nombre = btrim(r.nombre2_visitante));
+
+        ALTER TABLE resultados
+            DROP COLUMN nombre1_local,
+            DROP COLUMN nombre2_local,
+            DROP COLUMN nombre1_visitante,
+            DROP COLUMN nombre2_visitante;
+    END IF;
+END $$;
+
+CREATE INDEX IF NOT EXISTS resultados_jugador1_local_id_idx ON resultados (jugador1_local_id);
+CREATE INDEX IF NOT EXISTS resultados_jugador2_local_id_idx ON resultados (jugador2_local_id);
+CREATE INDEX IF NOT EXISTS resultados_jugador1_visitante_id_idx ON resultados (jugador1_visitante_id);
+CREATE INDEX IF NOT EXISTS resultados_jugador2_visitante_id_idx ON resultados (jugador2_visitante_id);
+
+-- Player history: one row per player and partido. Each branch filters on its own index,
+-- e.g. SELECT * FROM jugador_partidos WHERE jugador_id = 42
+CREATE OR REPLACE VIEW jugador_partidos AS
+SELECT jugador1_local_id AS jugador_id, partido_api_id, enfrentamiento_api_id, TRUE AS es_local,
+       is_local_ganador AS ganado
+FROM resultados WHERE jugador1_local_id IS NOT NULL
+UNION ALL
+SELECT jugador2_local_id, partido_api_id, enfrentamiento_api_id, TRUE, is_local_ganador
+FROM resultados WHERE jugador2_local_id IS NOT NULL
+UNION ALL
+SELECT jugador1_visitante_id, partido_api_id, enfrentamiento_api_id, FALSE, NOT is_local_ganador
+FROM resultados WHERE jugador1_visitante_id IS NOT NULL
+UNION ALL
+SELECT jugador2_visitante_id, partido_api_id, enfrentamiento_api_id, FALSE, NOT is_local_ganador
+FROM resultados WHERE jugador2_visitante_id IS NOT NULL;
+
+-- resultados with the player names, as they were stored before the jugadores table
+CREATE OR REPLACE VIEW resultados_con_nombres AS
+SELECT r.partido_api_id, r.enfrentamiento_api_id, r.is_local_ganador,
+       j1l.nombre AS nombre1_local, j2l.nombre AS nombre2_local,
+       j1v.nombre AS nombre1_visitante, j2v.nombre AS nombre2_visitante,
+       r.set1_local, r.set1_visitante, r.set2_local, r.set2_visitante, r.set3_local, r.set3_visitante,
+       r.pista, r.puntos, r.fecha
+FROM resultados r
+LEFT JOIN jugadores j1l ON j1l.id = r.jugador1_local_id
+LEFT JOIN jugadores j2l ON j2l.id = r.jugador2_local_id
+LEFT JOIN jugadores j1v ON j1v.id = r.jugador1_visitante_id
+LEFT JOIN jugadores j2v ON j2v.id = r.jugador2_visitante_id;
+
+-- Historical backfill (main.py --backfill): one row per competition id scanned, and one shard per
+-- category. A shard is only 'done' once its rows are committed; anything else is redone on the next run.
+CREATE TABLE IF NOT EXISTS backfill_competiciones (
+    competicion_api_id INTEGER PRIMARY KEY,
+    snapshot_date DATE,                     -- 'fecha' of every row of the season: day of its last enfrentamiento
+    categorias INTEGER NOT NULL,            -- 0: the id has no categories, nothing to backfill
+    planned_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS backfill_shards (
+    competicion_api_id INTEGER NOT NULL REFERENCES backfill_competiciones(competicion_api_id),
+    categoria_api_id INTEGER NOT NULL,
+    status VARCHAR(10) NOT NULL DEFAULT 'pending',  -- pending | done | failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    filas INTEGER,
+    error TEXT,
+    updated_at TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (competicion_api_id, categoria_api_id)
+);
+
+-- Rows rejected by the validation before load (etl/validation.py), with the reasons and the row as it
+-- would have been loaded. A row rejected again only bumps veces/ultima_vez.
+CREATE TABLE IF NOT EXISTS cuarentena (
+    id BIGSERIAL PRIMARY KEY,
+    tabla VARCHAR(30) NOT NULL,
+    clave TEXT NOT NULL,                    -- key columns joined with '|', e.g. 'Club X|30000'
+    motivo TEXT NOT NULL,
+    fila JSONB NOT NULL,
+    veces INTEGER NOT NULL DEFAULT 1,
+    primera_vez TIMESTAMP NOT NULL DEFAULT now(),
+    ultima_vez TIMESTAMP NOT NULL DEFAULT now(),
+    UNIQUE (tabla, clave, motivo)
+);
+
+-- Aggregates kept up to date by the ETL (etl/aggregates.py), in the same transaction as the resultados they
+-- come from: each changed partido adds its counters and subtracts those of the version it replaces. Only
+-- partidos with at least one set score count; the winning side gets the partido's puntos.
+-- Standings of a category: SELECT * FROM clasificacion WHERE categoria_api_id = 30000 ORDER BY puntos DESC
+CREATE TABLE IF NOT EXISTS clasificacion (
+    categoria_api_id INTEGER NOT NULL REFERENCES categorias(categoria_api_id),
+    club VARCHAR(100) NOT NULL,             -- enfrentamientos.club_local_id / club_visitante_id
+    partidos_jugados INTEGER NOT NULL DEFAULT 0,
+    partidos_ganados INTEGER NOT NULL DEFAULT 0,
+    partidos_perdidos INTEGER NOT NULL DEFAULT 0,
+    puntos INTEGER NOT NULL DEFAULT 0,
+    sets_favor INTEGER NOT NULL DEFAULT 0,
+    sets_contra INTEGER NOT NULL DEFAULT 0,
+    juegos_favor INTEGER NOT NULL DEFAULT 0,
+    juegos_contra INTEGER NOT NULL DEFAULT 0,
+    diferencia_sets INTEGER GENERATED ALWAYS AS (sets_favor - sets_contra) STORED,
+    diferencia_juegos INTEGER GENERATED ALWAYS AS (juegos_favor - juegos_contra) STORED,
+    updated_at TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (categoria_api_id, club)
+);
+
+-- Player stats per category: SELECT * FROM estadisticas_jugadores WHERE jugador_id = 42
+CREATE TABLE IF NOT EXISTS estadisticas_jugadores (
+    jugador_id INTEGER NOT NULL REFERENCES jugadores(id),
+    categoria_api_id INTEGER NOT NULL REFERENCES categorias(categoria_api_id),
+    partidos_jugados INTEGER NOT NULL DEFAULT 0,
+    partidos_ganados INTEGER NOT NULL DEFAULT 0,
+    sets_ganados INTEGER NOT NULL DEFAULT 0,
+    sets_perdidos INTEGER NOT NULL DEFAULT 0,
+    juegos_ganados INTEGER NOT NULL DEFAULT 0,
+    juegos_perdidos INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (jugador_id, categoria_api_id)
+);
+CREATE INDEX IF NOT EXISTS estadisticas_jugadores_categoria_idx ON estadisticas_jugadores (categoria_api_id);
+
+-- Single row written by every full rebuild of the aggregates: without it, the first load rebuilds them
+CREATE TABLE IF NOT EXISTS agregados_estado (
+    unica BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (unica),
+    reconstruido_at TIMESTAMP NOT NULL DEFAULT now()
+);
+-- Aggregates built before this table existed are already complete
+INSERT INTO agregados_estado (unica) SELECT TRUE WHERE EXISTS (SELECT 1 FROM clasificacion) ON CONFLICT DO NOTHING;
+
+-- Change feed (etl/changes.py): one row per row inserted or updated by the ETL, written by the upsert itself.
+-- Consumers read what is new since their last id: SELECT * FROM cambios WHERE id > 1234 ORDER BY id
+CREATE TABLE IF NOT EXISTS cambios (
+    id BIGSERIAL PRIMARY KEY,
+    run_id VARCHAR(20) NOT NULL,            -- timestamp of the run's log file, e.g. '20251001_080000'
+    tabla VARCHAR(30) NOT NULL,
+    operacion VARCHAR(6) NOT NULL,          -- insert | update
+    clave JSONB NOT NULL,                   -- conflict key, e.g. {"partido_api_id": 300000001}
+    antes JSONB,                            -- update: old values of the changed columns (insert: NULL)
+    despues JSONB,                          -- update: new values of the changed columns (insert: NULL)
+    creado_at TIMESTAMP NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS cambios_run_id_idx ON cambios (run_id);
+CREATE INDEX IF NOT EXISTS cambios_creado_at_idx ON cambios (creado_at);